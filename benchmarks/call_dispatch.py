@@ -0,0 +1,31 @@
+"""
+Per-call Python overhead of `sp_loader.<name>(...)` dispatch and statement building
+
+    $ python benchmarks/call_dispatch.py
+"""
+import timeit
+
+from common import FakeConnection, setup_django
+
+NUMBER = 100000
+
+
+def main():
+    setup_django()
+    from django_sp.loader import Loader
+
+    loader = Loader()
+    loader._connection = FakeConnection(rows=[(400,)], columns=('test_function',))
+
+    cases = [
+        ('function, positional', lambda: loader.test_function(100)),
+        ('function, keyword', lambda: loader.test_function(num=100)),
+        ('view, filters', lambda: loader.test_view(filters='amount > %s', params=(300,))),
+    ]
+    for title, call in cases:
+        seconds = min(timeit.repeat(call, number=NUMBER, repeat=5))
+        print('{:<25} {:>8.2f} us/call'.format(title, seconds / NUMBER * 1e6))
+
+
+if __name__ == '__main__':
+    main()
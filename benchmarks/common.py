@@ -0,0 +1,90 @@
+"""
+Django setup and fake database backend for benchmarks
+
+Fake cursor returns prepared rows without any I/O, so only the Python overhead of the package is measured.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(**extra_settings):
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    import django
+    from django.conf import settings
+
+    if not settings.configured:
+        options = dict(
+            INSTALLED_APPS=['django_sp.apps.DjangoSPConfig'],
+            DATABASES={
+                'default': {
+                    'ENGINE': 'django.db.backends.postgresql',
+                    'HOST': '127.0.0.1',
+                    'NAME': 'postgres',
+                    'USER': 'postgres'
+                }
+            },
+            SP_DIR='tests/',
+            # Fake cursor can't answer pg_catalog queries
+            SP_VALIDATE_ARGUMENTS=False,
+        )
+        options.update(extra_settings)
+        settings.configure(**options)
+        django.setup()
+
+
+class FakeCursor:
+    def __init__(self, rows, columns):
+        self._rows = rows
+        self.description = [(column, None, None, None, None, None, None) for column in columns]
+        self.rowcount = len(rows)
+        self._position = 0
+
+    def execute(self, statement, params=None):
+        self._position = 0
+
+    def fetchone(self):
+        if self._position >= len(self._rows):
+            return None
+        self._position += 1
+        return self._rows[self._position - 1]
+
+    def fetchmany(self, size=1):
+        rows = self._rows[self._position:self._position + size]
+        self._position += len(rows)
+        return rows
+
+    def fetchall(self):
+        return self.fetchmany(len(self._rows))
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def scroll(self, value, mode='relative'):
+        self._position = value if mode == 'absolute' else self._position + value
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FakeConnection:
+    """Stands for `django.db.connection` in the Loader"""
+
+    def __init__(self, rows=((1,),), columns=('id',)):
+        self.rows = list(rows)
+        self.columns = columns
+        self.connection = self
+
+    def cursor(self):
+        return FakeCursor(self.rows, self.columns)
+
+    chunked_cursor = cursor
@@ -0,0 +1,37 @@
+"""
+Batched `procedure.many(...)` against the loop of single calls
+
+Requires local PostgreSQL, configured like for the tests:
+
+    $ python benchmarks/many.py [calls]
+"""
+import sys
+import time
+
+from common import setup_django
+
+
+def main(calls: int = 1000):
+    setup_django(SP_VALIDATE_ARGUMENTS=True)
+    from django_sp.loader import Loader
+
+    loader = Loader()
+    loader.load_sp_into_db()
+    arguments = [(i,) for i in range(calls)]
+
+    started = time.perf_counter()
+    looped = [loader.test_function(*item) for item in arguments]
+    loop_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batched = loader.test_function.many(arguments)
+    many_time = time.perf_counter() - started
+
+    assert looped == batched
+    print('{} calls: loop {:.3f}s, many {:.3f}s ({:.1f}x)'.format(
+        calls, loop_time, many_time, loop_time / many_time
+    ))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,44 @@
+"""
+Time and memory of building 1M result rows in every `row_type` form from driver's tuples
+
+    $ python benchmarks/row_types.py [rows]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from common import setup_django
+
+COLUMNS = ['id', 'name', 'amount', 'created', 'active']
+
+
+def main():
+    setup_django()
+    from django_sp.rows import ROW_TYPES, make_rows
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rows = [(i, 'name', i * 2, None, True) for i in range(count)]
+
+    for row_type in ROW_TYPES:
+        gc.collect()
+        gc.disable()
+        started = time.perf_counter()
+        make_rows(rows, COLUMNS, row_type)
+        seconds = time.perf_counter() - started
+        gc.enable()
+
+        # Memory is measured separately, tracing slows allocations down
+        gc.collect()
+        tracemalloc.start()
+        result = make_rows(rows, COLUMNS, row_type)
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        print('{:<8} {:>8.3f} s {:>10.1f} MiB retained {:>10.1f} MiB peak'.format(
+            row_type, seconds, size / 2 ** 20, peak / 2 ** 20
+        ))
+
+
+if __name__ == '__main__':
+    main()
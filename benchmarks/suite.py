@@ -0,0 +1,246 @@
+"""
+Benchmark suite of the hot paths: call dispatch, `_get_res` for every `ret` mode, `row_to_dict`,
+`RawSQLFilterSet.sql` and deep pages of `PageNumberPaginator`
+
+Every case is timed with `timeit` (best of `--repeat` rounds, each one long enough to be measured), results are
+stored as JSON to compare them between versions of the package:
+
+    $ python benchmarks/suite.py --output before.json
+    $ python benchmarks/suite.py --output after.json --compare before.json
+
+`--backend fake` (default) measures only the Python overhead with the fake cursor, `--backend postgres` runs
+the same cases against local PostgreSQL, configured like for the tests. Comparison exits with status 1, if some
+case is slower than in the baseline by more than `--threshold`.
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import sys
+import timeit
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+from common import FakeConnection, FakeCursor, setup_django
+
+SIZES = (1, 1000, 100000)
+FILTERS_COUNT = 20
+PAGE_SIZE = 50
+COLUMNS = ('id', 'name', 'amount', 'created', 'active')
+# noinspection SqlDialectInspection, SqlNoDataSourceInspection
+ROWS_STATEMENT = "SELECT i AS id, 'name' AS name, i * 2 AS amount, now() AS created, true AS active " \
+                 "FROM generate_series(1, %s) i"
+
+
+class Backend:
+    """Source of rows for the cases, either the fake cursor or the database"""
+
+    def __init__(self, name: str):
+        self.name = name
+        settings = {} if name == 'fake' else {'SP_VALIDATE_ARGUMENTS': True}
+        setup_django(**settings)
+        from django_sp.loader import Loader
+
+        self.loader = Loader()
+        if name == 'postgres':
+            self.loader.load_sp_into_db()
+
+    def rows(self, size: int) -> List[Tuple]:
+        now = datetime.datetime.now()
+        return [(i, 'name', i * 2, now, True) for i in range(1, size + 1)]
+
+    def use_rows(self, size: int):
+        """Following calls of the loader return `size` rows"""
+        if self.name == 'fake':
+            self.loader._connection = FakeConnection(self.rows(size), COLUMNS)
+
+    def cursor(self, size: int):
+        """Client-side cursor with `size` rows for the paginator"""
+        if self.name == 'fake':
+            return FakeCursor(self.rows(size), COLUMNS)
+        return self.loader._get_res(ROWS_STATEMENT, [size], 'cursor')
+
+
+def dispatch_cases(backend: Backend):
+    loader = backend.loader
+    backend.use_rows(1)
+    yield 'dispatch.function positional', lambda: loader.test_function(100)
+    yield 'dispatch.function keyword', lambda: loader.test_function(num=100)
+    yield 'dispatch.view filters', lambda: loader.test_view(filters='amount > %s', params=(300,))
+
+
+def get_res_cases(backend: Backend):
+    loader = backend.loader
+    modes = ['one', 'all', 'cursor', 'stream']
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        modes.append('numpy')
+    if backend.name == 'postgres':
+        # JSON is built by the database, the fake cursor can't do it
+        modes.append('json')
+
+    def consume(ret: str, size: int) -> Callable:
+        def call():
+            res = loader._get_res(ROWS_STATEMENT, [size], ret, name='test_view')
+            if ret == 'stream':
+                for _ in res:
+                    pass
+            elif ret == 'cursor':
+                res.close()
+
+        return call
+
+    for size in SIZES:
+        # Cases are generated lazily, so the rows of the size are used by its cases only
+        backend.use_rows(size)
+        for ret in modes:
+            yield 'get_res.{}[{}]'.format(ret, size), consume(ret, size)
+
+
+def row_to_dict_cases(backend: Backend):
+    loader = backend.loader
+    row = backend.rows(1)[0]
+    yield 'row_to_dict', lambda: loader.row_to_dict(row, COLUMNS)
+
+
+def filterset_cases(backend: Backend):
+    from django_sp.helpers.rest_framework import IntegerFilter, RawSQLFilterSet
+
+    attrs = {'field{}'.format(i): IntegerFilter() for i in range(FILTERS_COUNT)}
+    attrs['Meta'] = type('Meta', (), {'order_by': ('-field0', 'field1')})
+    filterset_class = type('BenchmarkFilterSet', (RawSQLFilterSet,), attrs)
+    request = Request({'field{}__gte'.format(i): str(i) for i in range(FILTERS_COUNT)})
+
+    def build():
+        filterset = filterset_class(request)
+        return filterset.sql, filterset.params
+
+    yield 'filterset.sql[{} filters]'.format(FILTERS_COUNT), build
+
+
+def paginator_cases(backend: Backend):
+    from django_sp.helpers.rest_framework import PageNumberPaginator
+
+    size = SIZES[-1]
+    cursor = backend.cursor(size)
+    for page in (1, size // PAGE_SIZE):
+        request = Request({'page': str(page), 'page_size': str(PAGE_SIZE)})
+        yield 'paginator.page[{}]'.format(page), lambda request=request: PageNumberPaginator(cursor, request).data
+
+
+class Request:
+    def __init__(self, query_params: Dict[str, str]):
+        self.query_params = query_params
+
+    def build_absolute_uri(self) -> str:
+        return 'http://testserver/'
+
+
+CASES = (dispatch_cases, get_res_cases, row_to_dict_cases, filterset_cases, paginator_cases)
+
+
+def measure(call: Callable, repeat: int) -> Dict[str, float]:
+    timer = timeit.Timer(call)
+    number, _ = timer.autorange()
+    timings = [seconds / number for seconds in timer.repeat(repeat=repeat, number=number)]
+    return OrderedDict([
+        ('min', min(timings)),
+        ('median', statistics.median(timings)),
+        ('mean', statistics.mean(timings)),
+        ('stdev', statistics.stdev(timings) if len(timings) > 1 else 0.0),
+        ('number', number),
+        ('repeat', repeat),
+    ])
+
+
+def run(backend: Backend, repeat: int, only: str = None) -> Dict[str, Dict]:
+    results = OrderedDict()
+    for cases in CASES:
+        for name, call in cases(backend):
+            if only and only not in name:
+                continue
+            results[name] = measure(call, repeat)
+            print('{:<35} {:>14}'.format(name, format_time(results[name]['min'])), flush=True)
+    return results
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds >= 1 / scale:
+            return '{:.3f} {}'.format(seconds * scale, unit)
+    return '{:.1f} ns'.format(seconds * 1e9)
+
+
+def package_version() -> str:
+    try:
+        from importlib.metadata import PackageNotFoundError, version
+    except ImportError:
+        return 'unknown'
+    try:
+        return version('django_stored_procedures')
+    except PackageNotFoundError:
+        return 'unknown'
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> bool:
+    """Print ratios against the baseline, returns True if some case is slower by more than `threshold`"""
+    regressed = False
+    print()
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['min'] / baseline[name]['min']
+        mark = ''
+        if ratio > 1 + threshold:
+            mark, regressed = 'SLOWER', True
+        elif ratio < 1 - threshold:
+            mark = 'faster'
+        print('{:<35} {:>14} -> {:>14} {:>7.2f}x {}'.format(
+            name, format_time(baseline[name]['min']), format_time(result['min']), ratio, mark
+        ))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', choices=('fake', 'postgres'), default='fake')
+    parser.add_argument('--repeat', type=int, default=5, help='Rounds per case, the best one is reported.')
+    parser.add_argument('--filter', dest='only', help='Run only cases with the substring in the name.')
+    parser.add_argument('--output', help='Write results to the JSON file.')
+    parser.add_argument('--compare', metavar='BASELINE', help='Compare with results from the JSON file.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown, 0.2 (20%%) by default.')
+    args = parser.parse_args()
+
+    backend = Backend(args.backend)
+    results = run(backend, args.repeat, args.only)
+
+    if args.output:
+        import django
+
+        with open(args.output, 'w') as f:
+            json.dump(OrderedDict([
+                ('meta', OrderedDict([
+                    ('backend', args.backend),
+                    ('version', package_version()),
+                    ('python', platform.python_version()),
+                    ('django', django.get_version()),
+                    ('date', datetime.datetime.now().isoformat()),
+                ])),
+                ('results', results),
+            ]), f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['meta']['backend'] != args.backend:
+            print('Baseline was measured with {} backend'.format(baseline['meta']['backend']), file=sys.stderr)
+        if compare(results, baseline['results'], args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -17,5 +17,12 @@ class SPLoader:
             self._loader = Loader()
         return self._loader
 
+    @property
+    def aio(self):
+        return self().aio
+
+    def pipeline(self, using=None):
+        return self().pipeline(using)
+
 
 sp_loader = SPLoader()
@@ -0,0 +1,144 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Any, Callable, List
+
+from django.db import close_old_connections, connections
+
+from . import logger as base_logger
+
+logger = base_logger.getChild(__name__)
+
+
+def _run_in_thread(func: Callable, *args, **kwargs) -> Any:
+    """Run the call in the worker thread, honoring CONN_MAX_AGE like the request handler does"""
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+class AsyncStream:
+    """
+    Async iterator over rows of the `ret='stream'` call
+
+    Server-side cursor belongs to the connection of the thread, that declared it, so the stream has its own
+    thread. Rows are passed to the event loop by `itersize` chunks. The cursor, connection and thread are released,
+    when rows are over, on `aclose()` or exit from `async with` block, e.g. after `break`, or when the stream is
+    garbage collected.
+    """
+
+    def __init__(self, call: Callable, itersize: int):
+        self._call = call
+        self._itersize = itersize
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._rows = None
+        self._buffer = []
+
+    def __await__(self):
+        # `await aio.view(ret='stream')` and `aio.view(ret='stream')` give the same stream
+        yield from []
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __aenter__(self) -> 'AsyncStream':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    def __del__(self):
+        # Not consumed and not closed stream, the cursor is closed in its own thread without waiting for it
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            try:
+                executor.submit(self._close)
+            except RuntimeError:
+                # Interpreter is shutting down
+                pass
+            executor.shutdown(wait=False)
+
+    def _fetch(self) -> List:
+        if self._rows is None:
+            self._rows = self._call()
+        return list(islice(self._rows, self._itersize))
+
+    async def __anext__(self):
+        if not self._buffer:
+            loop = asyncio.get_event_loop()
+            self._buffer = await loop.run_in_executor(self._executor, self._fetch)
+            if not self._buffer:
+                await self.aclose()
+                raise StopAsyncIteration
+            self._buffer.reverse()
+        return self._buffer.pop()
+
+    def _close(self):
+        if self._rows is not None:
+            self._rows.close()
+        connections.close_all()
+
+    async def aclose(self):
+        if self._executor is None:
+            return
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=False)
+        self._executor = None
+
+
+class AsyncProcedure:
+    """Async counterpart of the procedure or view callable"""
+    __slots__ = ('procedure', '_executor')
+
+    def __init__(self, procedure, executor: ThreadPoolExecutor):
+        self.procedure = procedure
+        self._executor = executor
+
+    def __call__(self, *args, **kwargs):
+        """
+        Returns awaitable result of the call with the same arguments as the sync one
+
+        For `ret='stream'` returns `AsyncStream`, that can be iterated with `async for`.
+        """
+        if kwargs.get('ret') == 'stream':
+            itersize = kwargs.get('itersize') or self.procedure.loader.itersize
+            return AsyncStream(partial(self.procedure, *args, **kwargs), itersize)
+        return self._call(*args, **kwargs)
+
+    async def _call(self, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, partial(_run_in_thread, self.procedure, *args, **kwargs))
+
+
+class AsyncLoader:
+    """
+    Async API of the loader: `await sp_loader().aio.some_procedure(...)`
+
+    Calls are executed in the bounded thread pool, every thread uses its own database connection.
+    Procedures are the same, that the sync loader has discovered.
+    """
+
+    def __init__(self, loader, max_workers: int):
+        self._loader = loader
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __getitem__(self, item: str) -> AsyncProcedure:
+        return AsyncProcedure(self._loader[item], self._executor)
+
+    def __getattr__(self, item: str) -> AsyncProcedure:
+        if item.startswith('_') or item not in self._loader:
+            raise AttributeError(item)
+        return self[item]
+
+    def __contains__(self, item: str) -> bool:
+        return item in self._loader
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run any sync function, that uses the database, in the loader's thread pool"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, partial(_run_in_thread, func, *args, **kwargs))
@@ -1,4 +1,5 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
+from django.conf import settings
 
 from . import logger as base_logger
 
@@ -8,3 +9,9 @@ logger = base_logger.getChild(__name__)
 class DjangoSPConfig(AppConfig):
     name = 'django_sp'
     verbose_name = "Django Stored Procedures"
+
+    def ready(self):
+        from .cache import connect_model
+
+        for model, tags in getattr(settings, 'SP_CACHE_INVALIDATE_ON', {}).items():
+            connect_model(apps.get_model(model), tags)
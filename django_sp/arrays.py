@@ -0,0 +1,113 @@
+"""
+Column-major results as NumPy arrays, requires `numpy` package (`django_stored_procedures[numpy]`)
+"""
+import datetime
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+from . import logger as base_logger
+
+logger = base_logger.getChild(__name__)
+
+Cursor = TypeVar('Cursor')
+
+# PostgreSQL type OIDs from `cursor.description`, other types are kept as Python objects
+DTYPES = {
+    16: np.bool_,  # boolean
+    20: np.int64,  # bigint
+    21: np.int16,  # smallint
+    23: np.int32,  # integer
+    26: np.int64,  # oid
+    700: np.float32,  # real
+    701: np.float64,  # double precision
+    1700: np.float64,  # numeric
+    1082: 'datetime64[D]',  # date
+    1114: 'datetime64[us]',  # timestamp
+    1184: 'datetime64[us]',  # timestamp with time zone, stored in UTC
+    1186: 'timedelta64[us]',  # interval
+}
+
+
+def _naive_utc(value: datetime.datetime) -> datetime.datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+CONVERTERS = {
+    1184: _naive_utc,
+}  # type: Dict[int, Callable[[Any], Any]]
+
+
+def _type_code(column) -> Optional[int]:
+    return column.type_code if hasattr(column, 'type_code') else column[1]
+
+
+class ColumnBuilder:
+    """Typed array of the column, that grows while chunks of rows are added"""
+    __slots__ = ('dtype', 'converter', 'values', 'mask', 'size')
+
+    def __init__(self, type_code: Optional[int], capacity: int):
+        self.dtype = np.dtype(DTYPES.get(type_code, object))
+        self.converter = CONVERTERS.get(type_code)
+        self.values = np.empty(capacity, dtype=self.dtype)
+        self.mask = None
+        self.size = 0
+
+    def _reserve(self, size: int):
+        capacity = len(self.values)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity = max(capacity * 2, 1)
+        self.values = self._grow(self.values, capacity)
+        if self.mask is not None:
+            self.mask = self._grow(self.mask, capacity)
+
+    @staticmethod
+    def _grow(array: np.ndarray, capacity: int) -> np.ndarray:
+        grown = np.zeros(capacity, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def add(self, values: Tuple):
+        start, end = self.size, self.size + len(values)
+        self._reserve(end)
+        if self.converter is not None:
+            values = [value if value is None else self.converter(value) for value in values]
+        if self.dtype != object and None in values:
+            if self.mask is None:
+                self.mask = np.zeros(len(self.values), dtype=np.bool_)
+            self.mask[start:end] = [value is None for value in values]
+            fill = np.zeros(1, dtype=self.dtype)[0]
+            values = [fill if value is None else value for value in values]
+        self.values[start:end] = values
+        self.size = end
+
+    def build(self) -> np.ndarray:
+        values, mask = self.values, self.mask
+        if self.size < len(values):
+            values = values[:self.size].copy()
+            mask = mask[:self.size].copy() if mask is not None else None
+        if mask is None:
+            return values
+        return np.ma.MaskedArray(values, mask=mask)
+
+
+def fetch_arrays(cursor: Cursor, columns: List[str], itersize: int) -> Dict[str, np.ndarray]:
+    """
+    Fetch rows by `itersize` chunks into typed array per column
+
+    Arrays are preallocated for `cursor.rowcount` rows, if it is known. Columns with NULLs are returned as
+    masked arrays, NULLs of columns without numpy type (text, json and others) are kept as None.
+    """
+    capacity = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount > 0 else itersize
+    builders = [ColumnBuilder(_type_code(column), capacity) for column in cursor.description]
+    rows = cursor.fetchmany(itersize)
+    while rows:
+        for builder, values in zip(builders, zip(*rows)):
+            builder.add(values)
+        rows = cursor.fetchmany(itersize)
+    return OrderedDict((column, builder.build()) for column, builder in zip(columns, builders))
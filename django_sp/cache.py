@@ -0,0 +1,187 @@
+import hashlib
+import pickle
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from . import logger as base_logger
+from .sql import parse_definitions
+
+logger = base_logger.getChild(__name__)
+
+# Comment before the procedure's definition, e.g. `-- sp:cache timeout=60 tags=orders,customers`
+ANNOTATION_RE = re.compile(r'^--\s*sp:cache\b(?P<options>.*)$')
+
+Policy = namedtuple('Policy', ('timeout', 'tags'))
+
+
+class Missing:
+    __slots__ = ()
+
+
+missing = Missing()
+
+
+def parse_annotations(sql: str) -> Dict[str, Policy]:
+    """Returns cache policies from `-- sp:cache` annotations in the sql file"""
+    policies = {}
+    for statement in parse_definitions(sql):
+        for comment in statement.comments:
+            match = ANNOTATION_RE.match(comment)
+            if match is not None:
+                values = dict(option.split('=', 1) for option in match.group('options').split() if '=' in option)
+                policies[statement.name] = make_policy(values)
+    return policies
+
+
+def make_policy(options: Dict[str, Any]) -> Policy:
+    """Build policy from options dict with `timeout` (seconds) and `tags` (list or comma separated string)"""
+    tags = options.get('tags') or ()
+    if isinstance(tags, str):
+        tags = [tag for tag in tags.split(',') if tag]
+    return Policy(int(options.get('timeout', 60)), tuple(tags))
+
+
+class LocMemBackend:
+    """In-process LRU cache with expiration, values are pickled so callers can't change cached results"""
+
+    def __init__(self, size: int = 1000):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is None:
+                    continue
+                expires, value = item
+                if expires is not None and expires < now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                result[key] = value
+        return {key: pickle.loads(value) for key, value in result.items()}
+
+    def get(self, key: str, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None):
+        expires = time.monotonic() + timeout if timeout is not None else None
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    """Stores results in the Django's cache with `alias`"""
+
+    def __init__(self, alias: str = 'default'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        return self.cache.get_many(list(keys))
+
+    def get(self, key: str, default=None):
+        return self.cache.get(key, default)
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None):
+        self.cache.set(key, value, timeout)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class ResultCache:
+    """
+    Cache for results of procedures and views calls
+
+    Only procedures with policy (timeout and tags) are cached. Policies come from the `SP_CACHE` setting and
+    `-- sp:cache` annotations in sql files. Every procedure and tag has a generation token, that is part of the
+    result key, so invalidation by name or by tag just replaces the token.
+    """
+    KEY_PREFIX = 'django_sp:result:'
+    GENERATION_PREFIX = 'django_sp:generation:'
+
+    def __init__(self, backend, policies: Optional[Dict[str, Policy]] = None):
+        self.backend = backend
+        self.policies = dict(policies or {})
+
+    def policy(self, name: str) -> Optional[Policy]:
+        return self.policies.get(name)
+
+    def _generations(self, keys: List[str]) -> List[str]:
+        generations = self.backend.get_many(keys)
+        for key in keys:
+            if key not in generations:
+                # Lost generation means that results made with it can't be trusted
+                generations[key] = self._new_generation(key)
+        return [generations[key] for key in keys]
+
+    def _new_generation(self, key: str) -> str:
+        generation = uuid.uuid4().hex
+        self.backend.set(key, generation, None)
+        return generation
+
+    def key(self, name: str, policy: Policy, statement: str, params: Optional[Iterable], ret: Any) -> str:
+        generation_keys = [self.GENERATION_PREFIX + 'name:' + name]
+        generation_keys += [self.GENERATION_PREFIX + 'tag:' + tag for tag in policy.tags]
+        signature = repr((name, statement, tuple(params or ()), ret, self._generations(generation_keys)))
+        return self.KEY_PREFIX + hashlib.md5(signature.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        return self.backend.get(key, missing)
+
+    def set(self, key: str, value: Any, policy: Policy):
+        self.backend.set(key, value, policy.timeout)
+
+    def invalidate(self, name: str):
+        """Invalidate all cached results of the procedure"""
+        self._new_generation(self.GENERATION_PREFIX + 'name:' + name)
+
+    def invalidate_tag(self, tag: str):
+        """Invalidate cached results of all procedures with the tag"""
+        self._new_generation(self.GENERATION_PREFIX + 'tag:' + tag)
+
+
+def connect_model(model, tags: Iterable[str]):
+    """Invalidate `tags` on every save and delete of the `model` instances"""
+    from django.db.models.signals import post_delete, post_save
+    from . import sp_loader
+
+    tags = tuple(tags)
+
+    def invalidate(**kwargs):
+        for tag in tags:
+            sp_loader().cache.invalidate_tag(tag)
+
+    for action, signal in (('save', post_save), ('delete', post_delete)):
+        signal.connect(invalidate, sender=model, weak=False,
+                       dispatch_uid='django_sp:{}:{}'.format(model._meta.label, action))
+
+
+def get_backend(config: Optional[Dict[str, Any]] = None):
+    """Create backend from the config in the `CACHES` items format: {'BACKEND': 'dotted.path', 'OPTIONS': {}}"""
+    config = config or {}
+    backend = import_string(config.get('BACKEND', 'django_sp.cache.LocMemBackend'))
+    return backend(**config.get('OPTIONS', {}))
@@ -0,0 +1,77 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict, TypeVar
+
+from . import logger as base_logger
+
+logger = base_logger.getChild(__name__)
+
+Cursor = TypeVar('Cursor')
+
+TABLE = 'django_sp_checksums'
+
+# noinspection SqlDialectInspection, SqlNoDataSourceInspection
+CREATE_TABLE_QUERY = """
+CREATE TABLE IF NOT EXISTS {table} (
+    path text PRIMARY KEY,
+    checksum text NOT NULL,
+    updated_at timestamp with time zone NOT NULL DEFAULT now()
+)
+""".format(table=TABLE)
+
+# noinspection SqlDialectInspection, SqlNoDataSourceInspection
+STORE_QUERY = """
+INSERT INTO {table} (path, checksum) VALUES (%s, %s)
+ON CONFLICT (path) DO UPDATE SET checksum = EXCLUDED.checksum, updated_at = now()
+""".format(table=TABLE)
+
+
+class UploadReport:
+    """
+    Files executed (or to be executed on dry run), skipped as unchanged, failed with their errors and rolled back
+    because of failure of other file in the same transaction. `timings` are (statement, seconds) pairs.
+    """
+
+    def __init__(self):
+        self.changed = []
+        self.skipped = []
+        self.failed = OrderedDict()
+        self.rolled_back = []
+        self.timings = []
+
+    def __str__(self):
+        summary = '{} changed, {} skipped, {} failed'.format(len(self.changed), len(self.skipped), len(self.failed))
+        if self.rolled_back:
+            summary += ', {} rolled back'.format(len(self.rolled_back))
+        return summary
+
+    def __contains__(self, sp_file: str) -> bool:
+        return sp_file in self.failed or sp_file in self.changed or sp_file in self.rolled_back
+
+    def update(self, other: 'UploadReport'):
+        self.changed += other.changed
+        self.skipped += other.skipped
+        self.failed.update(other.failed)
+        self.rolled_back += other.rolled_back
+        self.timings += other.timings
+
+
+def checksum(sql: str) -> str:
+    return hashlib.sha256(sql.encode('utf-8')).hexdigest()
+
+
+def load_checksums(cursor: Cursor) -> Dict[str, str]:
+    """Returns checksums of the files by their keys, empty dict if nothing was uploaded yet"""
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [TABLE])
+    if not cursor.fetchone()[0]:
+        return {}
+    cursor.execute('SELECT path, checksum FROM {}'.format(TABLE))
+    return dict(cursor.fetchall())
+
+
+def ensure_table(cursor: Cursor):
+    cursor.execute(CREATE_TABLE_QUERY)
+
+
+def store_checksum(cursor: Cursor, key: str, value: str):
+    cursor.execute(STORE_QUERY, [key, value])
@@ -1,17 +1,26 @@
+import base64
 import datetime
+import hashlib
+import json
 import re
+import threading
 from collections import OrderedDict, defaultdict
 from decimal import Decimal
-from typing import Any, Callable, Dict, Generator, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Generator, Hashable, List, Optional, Tuple, Union
 
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from django.utils.dateparse import parse_datetime
 from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.utils.urls import replace_query_param, remove_query_param
 
 from django_sp import sp_loader
+from django_sp.rows import make_rows
 from . import logger as base_logger
 
 __all__ = ['RawSQLFilterSet', 'RawSQLFilter', 'StringFilter', 'IntegerFilter', 'DecimalFilter', 'DateTimeFilter']
@@ -30,6 +39,15 @@ class NoValue:
 novalue = NoValue()
 
 
+def order_by_sql(ordering: Tuple[Tuple[str, bool], ...]) -> str:
+    """Generate 'ORDER BY ...' string from pairs (field, descending)"""
+    if not ordering:
+        return ''
+    return "ORDER BY {}".format(", ".join(
+        "{field} {direction}".format(field=field, direction='DESC' if desc else 'ASC') for field, desc in ordering
+    ))
+
+
 def get_declared_filters(attrs, bases) -> Dict[str, Any]:
     filters = []
     for filter_name, obj in list(attrs.items()):
@@ -46,11 +64,43 @@ def get_declared_filters(attrs, bases) -> Dict[str, Any]:
 
 
 class RawSQLFilterSetOptions:
-    __slots__ = ('order_by', 'logical_or')
+    __slots__ = ('order_by', 'logical_or', 'ordering')
 
     def __init__(self, options=None):
         self.order_by = getattr(options, 'order_by', False)
         self.logical_or = getattr(options, 'logical_or', [])
+        # Parsed `order_by`, see `RawSQLFilterSet.ordering`
+        self.ordering = None
+
+
+class CompiledConditions:
+    """Bounded LRU of conditions' SQL by request shape, one per filterset class"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, shape: Tuple) -> Optional[str]:
+        with self._lock:
+            sql = self._data.get(shape)
+            if sql is not None:
+                self._data.move_to_end(shape)
+            return sql
+
+    def set(self, shape: Tuple, sql: str):
+        with self._lock:
+            self._data[shape] = sql
+            self._data.move_to_end(shape)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
 
 
 class RawSQLFilterMeta(type):
@@ -69,6 +119,7 @@ class RawSQLFilterMeta(type):
 
         new_class._meta = RawSQLFilterSetOptions(getattr(new_class, 'Meta', None))
         new_class.filters = filters
+        new_class._compiled = CompiledConditions(new_class.conditions_cache_size)
         return new_class
 
 
@@ -97,6 +148,19 @@ class RawSQLFilter:
     def set_filterset(self, filter_set: 'RawSQLFilterSet'):
         self._filter_set = filter_set
 
+    def bind(self, filter_set: 'RawSQLFilterSet') -> 'RawSQLFilter':
+        """
+        Returns copy of the filter bound to the filterset
+
+        Declared filters are class attributes, shared by all filtersets of the class and so by concurrent requests,
+        only bound copies keep the reference to the filterset.
+        """
+        # Shallow copy without `copy.copy` machinery, it is done for every filter of every request
+        bound = object.__new__(type(self))
+        bound.__dict__.update(self.__dict__)
+        bound._filter_set = filter_set
+        return bound
+
     @staticmethod
     def _isnull_condition_replace(value: str) -> [str, NoValue]:
         value = value.lower()
@@ -115,20 +179,48 @@ class RawSQLFilter:
         Value also passed through the `parse_value` method.
         
         Returns full sql condition such as 'field_name >= %s' and parsed value.
+
+        Filtersets build conditions with `sql()` and `values()` instead, so SQL can be compiled once per request
+        shape. Subclasses, that override this method, are called on every request.
         """
-        if self._map_to is not None:
-            name = self._map_to
+        sql = self.sql(name, condition, value)
+        for value_ in self.values(condition, value):
+            self._filter_set.params = value_
+        return sql
 
+    def _operator(self, condition: str, value: str) -> Tuple[str, Any]:
         sql_condition = self.OPERATORS_MAPPING.get(condition, condition)
 
         method = getattr(self, sql_condition, None)
         if method is not None and callable(method):
             sql_condition, value = method(value)
+        return sql_condition, value
 
-        sql = "{} {}{}".format(name, sql_condition, ' %s' if value is not novalue else '')
-        self._filter_set.params = self._parse_value(value)
+    def shape(self, condition: str, value: str) -> Hashable:
+        """
+        Part of the key of the compiled conditions, `sql()` must return the same string for the same shape
 
-        return sql
+        Operators, that are methods (`isnull`), choose SQL by the value, so it is the part of the shape for them.
+        """
+        sql_condition = self.OPERATORS_MAPPING.get(condition, condition)
+        if callable(getattr(self, sql_condition, None)):
+            return condition, value.lower()
+        return condition
+
+    def sql(self, name: str, condition: str, value: str) -> str:
+        """Returns sql condition with placeholders such as 'field_name >= %s'"""
+        if self._map_to is not None:
+            name = self._map_to
+
+        sql_condition, value = self._operator(condition, value)
+        return "{} {}{}".format(name, sql_condition, ' %s' if value is not novalue else '')
+
+    def values(self, condition: str, value: str) -> List:
+        """Returns parsed values for placeholders of `sql()`"""
+        sql_condition, value = self._operator(condition, value)
+        if value is novalue:
+            return []
+        return [self._parse_value(value)]
 
     def _convert(self, value: Any) -> Any:
         try:
@@ -227,29 +319,34 @@ class CombinedSearchFilter(StringFilter):
         self.strict_search = strict_search
         self.case_sensitive = case_sensitive
 
-    def filter(self, name: str, condition: str, value: str) -> str:
+    def sql(self, name: str, condition: str, value: str) -> str:
         """
         Return query condition like::
             (field1 LIKE %s OR fields2 LIKE %s)
-
-        Also append required number of parameters with `value` and % sign in place, specified by `wildcard_place`
         """
         conditions = []
-        value_template = self.value_templates[self.wildcard_place]
-        wildcarded_value = value_template.format(self._parse_value(value))
-
         for field in self.search_fields:
             if self.strict_search or field in self.strict_fields:
                 operator = '='
-                value_ = value
             else:
-                value_ = wildcarded_value
                 operator = 'LIKE' if self.case_sensitive else 'ILIKE'
-
             conditions.append('{field} {op} %s'.format(field=field, op=operator))
-            self._filter_set.params = value_
-        res = "({})".format(" OR ".join(conditions))
-        return res
+        return "({})".format(" OR ".join(conditions))
+
+    def shape(self, condition: str, value: str) -> Hashable:
+        # Condition is ignored, SQL depends on the fields only
+        return None
+
+    def values(self, condition: str, value: str) -> List:
+        """
+        Return required number of parameters with `value` and % sign in place, specified by `wildcard_place`
+        """
+        value_template = self.value_templates[self.wildcard_place]
+        wildcarded_value = value_template.format(self._parse_value(value))
+        return [
+            value if self.strict_search or field in self.strict_fields else wildcarded_value
+            for field in self.search_fields
+        ]
 
 
 class RawSQLFilterSet(metaclass=RawSQLFilterMeta):
@@ -258,6 +355,8 @@ class RawSQLFilterSet(metaclass=RawSQLFilterMeta):
     # TODO: Support for group by multiple fields
 
     ORDER_BY_RE = re.compile('^(?P<desc>-)?(?P<field>\w+)')
+    # Number of request shapes, which compiled conditions are kept for the class, see `conditions`
+    conditions_cache_size = 128
 
     def __init__(self, request=None):
         self._request = request
@@ -265,9 +364,6 @@ class RawSQLFilterSet(metaclass=RawSQLFilterMeta):
         self._params_values = []
         self._conditions_built = False
 
-        for f in self.filters.values():
-            f.set_filterset(self)
-
     def _build_request_filters(self, request) -> Dict[str, List[Tuple[str, Any]]]:
         """
         Build filters from GET params (DRF's `query_params`)
@@ -303,6 +399,36 @@ class RawSQLFilterSet(metaclass=RawSQLFilterMeta):
         else:
             return param, '=', value
 
+    @cached_property
+    def conditions(self) -> str:
+        """
+        Returns sql conditions without ORDER BY clause
+
+        Placeholders and `params` are the same as for `sql`.
+
+        SQL depends only on the shape of the request: which filters with which conditions are present. It is built
+        once per shape and kept in the LRU of the filterset class (`conditions_cache_size` shapes), on every request
+        values are only converted and validated. The same shape always gives the same statement text, so the
+        database can reuse its plan.
+        """
+        and_items, or_items = self._request_items()
+        shape = self._shape(and_items + or_items)
+        raw_sql = self._compiled.get(shape) if shape is not None else None
+
+        and_cond = self._generate_conditions(and_items, build_sql=raw_sql is None)
+        or_cond = self._generate_conditions(or_items, build_sql=raw_sql is None)
+
+        if raw_sql is None:
+            raw_sql = " AND ".join(and_cond)
+            if self._meta.logical_or:
+                or_sql = "({or_})".format(or_=" OR ".join(or_cond) or 'TRUE')
+                raw_sql = "{raw_sql} AND {or_sql}".format(raw_sql=raw_sql, or_sql=or_sql) if raw_sql else or_sql
+            if shape is not None:
+                self._compiled.set(shape, raw_sql)
+
+        self._conditions_built = True
+        return raw_sql
+
     @cached_property
     def sql(self) -> str:
         """
@@ -312,21 +438,7 @@ class RawSQLFilterSet(metaclass=RawSQLFilterMeta):
         Real values are availible at `params` property, only after querying this method. They are must be passed 
         as `params` argument for cursor's `execute` method to be escaped in right way.
         """
-        and_cond = self._generate_conditions(
-            ((name, filter_) for name, filter_ in self.filters.items() if name not in self._meta.logical_or)
-        )
-
-        or_cond = self._generate_conditions(
-            ((name, filter_) for name, filter_ in self.filters.items() if name in self._meta.logical_or)
-        )
-
-        raw_sql = " AND ".join(and_cond)
-        if self._meta.logical_or:
-            raw_sql = "{raw_sql} AND ({or_})".format(raw_sql=raw_sql, or_=" OR ".join(or_cond) or 'TRUE')
-        raw_sql = "{raw_sql} {order_by}".format(raw_sql=raw_sql, order_by=self._get_order_by())
-
-        self._conditions_built = True
-        return raw_sql
+        return "{raw_sql} {order_by}".format(raw_sql=self.conditions, order_by=self._get_order_by())
 
     @property
     def params(self) -> Tuple[Any, ...]:
@@ -339,47 +451,107 @@ class RawSQLFilterSet(metaclass=RawSQLFilterMeta):
         if value is not novalue:
             self._params_values.append(value)
 
+    @cached_property
+    def ordering(self) -> Tuple[Tuple[str, bool], ...]:
+        """
+        Returns pairs (field, descending), based on `Meta.order_by` value
+
+        `Meta.order_by` can be a single field or a sequence of fields. It is parsed once per filterset class.
+        """
+        ordering = self._meta.ordering
+        if ordering is not None:
+            return ordering
+
+        order_by = self._meta.order_by
+        if not order_by:
+            order_by = ()
+        elif isinstance(order_by, str):
+            order_by = (order_by,)
+
+        ordering = []
+        for item in order_by:
+            direction, field = self.ORDER_BY_RE.search(item).groups()
+            ordering.append((field, direction is not None))
+        self._meta.ordering = tuple(ordering)
+        return self._meta.ordering
+
     def _get_order_by(self) -> str:
         """
         Generate 'ORDER BY ...' string, based on `Meta.order_by` value
         
         `-field_name` - for DESC ordering, `field_name` - for ASC ordering 
         """
-        if not self._meta.order_by:
-            return ''
-
-        direction, field = self.ORDER_BY_RE.search(self._meta.order_by).groups()
-        return "ORDER BY {field} {direction}".format(
-            field=field, direction='ASC' if direction is None else 'DESC'
-        )
+        return order_by_sql(self.ordering)
 
-    def _generate_conditions(self,
-                             filters: Generator[Tuple[str, RawSQLFilter], None, None]) -> Generator[str, None, None]:
+    def _request_items(self) -> Tuple[List[Tuple[str, RawSQLFilter, Optional[str], Any]], List[Tuple]]:
         """
-        Returns generator, yields raw-sql conditions strings
-         
-        E.g. 'field_name >= %s`
-        
-        :param filters: Generator with filter's name and `RawSQLFilter` instance
+        Returns (name, filter, condition, value) of the request's filters in the order of declaration,
+        separately for the rest of filters and for `Meta.logical_or` group
+
+        Filters, that are absent in the request, but have default value, are returned with `None` condition.
         """
-        for name, filter_ in filters:
-            conds_and_values = self._request_filters.get(name)
+        and_items, or_items = [], []
+        logical_or = self._meta.logical_or
+        request_filters = self._request_filters
+        for name, filter_ in self.filters.items():
+            items = or_items if name in logical_or else and_items
+            conds_and_values = request_filters.get(name)
             if conds_and_values:
                 for condition, value in conds_and_values:
-                    try:
-                        sql = filter_.filter(name, condition, value)
-                    except ValidationError as e:
-                        raise ValidationError('Exception raised for {}: {}'.format(name, e))
-                    yield sql
+                    items.append((name, filter_, condition, value))
             elif filter_.default is not None:
-                self.params = filter_.default
-                yield "{} = %s".format(name)
+                items.append((name, filter_, None, filter_.default))
+        return and_items, or_items
+
+    @staticmethod
+    def _shape(items: List[Tuple[str, RawSQLFilter, Optional[str], Any]]) -> Optional[Tuple]:
+        """Key of the compiled conditions, None if some filter overrides `filter()` and can't be compiled"""
+        shape = []
+        for name, filter_, condition, value in items:
+            if condition is None:
+                shape.append((name, None))
+            elif type(filter_).filter is not RawSQLFilter.filter:
+                return None
+            else:
+                shape.append((name, filter_.shape(condition, value)))
+        return tuple(shape)
+
+    def _generate_conditions(self, items: List[Tuple[str, RawSQLFilter, Optional[str], Any]],
+                             build_sql: bool = True) -> List[Optional[str]]:
+        """
+        Returns raw-sql conditions strings and collects their `params`
+
+        E.g. 'field_name >= %s`, conditions are None, if `build_sql` is False and filter can be compiled.
+
+        :param items: Filters of the request, see `_request_items`
+        """
+        conditions = []
+        for name, filter_, condition, value in items:
+            if condition is None:
+                self.params = value
+                conditions.append("{} = %s".format(name))
+                continue
+
+            try:
+                if type(filter_).filter is not RawSQLFilter.filter:
+                    # Filters of the class are shared between threads, conditions are built by the bound copy
+                    conditions.append(filter_.bind(self).filter(name, condition, value))
+                    continue
+                values = filter_.values(condition, value)
+            except ValidationError as e:
+                raise ValidationError('Exception raised for {}: {}'.format(name, e))
+            for value_ in values:
+                self.params = value_
+            conditions.append(filter_.sql(name, condition, value) if build_sql else None)
+        return conditions
 
 
 class PageNumberPaginator:
     default_page_size = 50
     page_size_param = 'page_size'
     page_number_param = 'page'
+    # Form of `data` rows, see `django_sp.rows.make_rows`; serializers in `response()` need dicts
+    row_type = 'dict'
 
     def __init__(self, cursor, request: Request):
         self.cursor = cursor
@@ -434,7 +606,7 @@ class PageNumberPaginator:
     def data(self) -> List:
         self._scroll()
         columns = sp_loader().columns_from_cursor(self.cursor)
-        return [sp_loader().row_to_dict(row, columns) for row in self.cursor.fetchmany(self.page_size)]
+        return make_rows(self.cursor.fetchmany(self.page_size), columns, self.row_type)
 
     def response(self, serializer: Optional[Callable] = None) -> Response:
         data = self.data
@@ -452,3 +624,249 @@ class PageNumberPaginator:
                 ]
             )
         )
+
+
+class SQLPageNumberPaginator(PageNumberPaginator):
+    """
+    Page number pagination with LIMIT/OFFSET and COUNT done by the database
+
+    Only the rows of the requested page are fetched. Total count is selected with separate `count(*)` query
+    and is cached per view and filter conditions for `count_cache_timeout` seconds (0 disables the cache).
+    """
+    count_cache_alias = 'default'
+    count_cache_timeout = 60
+
+    # noinspection PyMissingConstructor
+    def __init__(self, view_name: str, filterset: RawSQLFilterSet, request: Request):
+        self.view_name = view_name
+        self.filterset = filterset
+        self.request = request
+
+    def _count_cache_key(self) -> str:
+        signature = repr((self.view_name, self.filterset.conditions, self.filterset.params))
+        return 'django_sp:count:{}'.format(hashlib.md5(signature.encode('utf-8')).hexdigest())
+
+    def _query_count(self) -> int:
+        return sp_loader()[self.view_name](
+            filters=self.filterset.conditions, params=self.filterset.params, fields='count(*) AS count', ret='one'
+        )['count']
+
+    @cached_property
+    def count(self) -> int:
+        if not self.count_cache_timeout:
+            return self._query_count()
+
+        cache = caches[self.count_cache_alias]
+        key = self._count_cache_key()
+        count = cache.get(key)
+        if count is None:
+            count = self._query_count()
+            cache.set(key, count, self.count_cache_timeout)
+        return count
+
+    @cached_property
+    def data(self) -> List:
+        filters = "{conditions} {order_by}".format(
+            conditions=self.filterset.conditions or 'TRUE', order_by=self.filterset._get_order_by()
+        )
+        return sp_loader()[self.view_name](
+            filters=filters, params=self.filterset.params, ret='all', limit=self.page_size, offset=self.offset,
+            row_type=self.row_type
+        )
+
+
+class KeysetPaginator:
+    """
+    Paginate view with seek method instead of OFFSET
+
+    Rows are ordered by `Meta.order_by` fields of the filterset and each page is selected with
+    `WHERE (fields) > (last seen values) ... LIMIT page_size + 1`, so the cost of the page does not
+    depend on how deep it is. Ordering fields must be present in the view's columns and, taken together,
+    must be unique (add primary key as the last one).
+    """
+    default_page_size = 50
+    page_size_param = 'page_size'
+    cursor_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, view_name: str, filterset: RawSQLFilterSet, request: Request):
+        self.view_name = view_name
+        self.filterset = filterset
+        self.request = request
+        assert self.filterset.ordering, "`Meta.order_by` must be set for keyset pagination"
+
+    @cached_property
+    def page_size(self) -> int:
+        return int(self.request.query_params.get(self.page_size_param, self.default_page_size))
+
+    @cached_property
+    def position(self) -> Tuple[Optional[List], bool]:
+        """Decode values of the ordering fields and direction flag from request's cursor"""
+        token = self.request.query_params.get(self.cursor_param)
+        if not token:
+            return None, False
+        try:
+            position = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+            values, reverse = position['p'], bool(position['r'])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.filterset.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    @staticmethod
+    def encode_position(values: List, reverse: bool) -> str:
+        position = json.dumps({'p': values, 'r': int(reverse)}, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _seek_condition(ordering: Tuple[Tuple[str, bool], ...], values: List) -> str:
+        """
+        Generate condition, that selects rows placed after `values` in `ordering`
+
+        Uses row comparison when all fields are sorted in one direction, so index on the fields can be used.
+        """
+        operators = ['<' if desc else '>' for _, desc in ordering]
+        fields = [field for field, _ in ordering]
+        if len(set(operators)) == 1:
+            return "({fields}) {op} ({placeholders})".format(
+                fields=", ".join(fields), op=operators[0], placeholders=", ".join(['%s'] * len(values))
+            )
+
+        conditions = []
+        for i, field in enumerate(fields):
+            parts = ["{} = %s".format(prev) for prev in fields[:i]]
+            parts.append("{} {} %s".format(field, operators[i]))
+            conditions.append("({})".format(" AND ".join(parts)))
+        return "({})".format(" OR ".join(conditions))
+
+    @staticmethod
+    def _seek_params(ordering: Tuple[Tuple[str, bool], ...], values: List) -> List:
+        operators = {desc for _, desc in ordering}
+        if len(operators) == 1:
+            return list(values)
+        return [value for i in range(len(values)) for value in values[:i + 1]]
+
+    @cached_property
+    def rows(self) -> List[Dict]:
+        """Rows of the current page plus one extra row, if there is more rows in the requested direction"""
+        values, reverse = self.position
+        ordering = self.filterset.ordering
+        if reverse:
+            ordering = tuple((field, not desc) for field, desc in ordering)
+
+        conditions = []
+        params = []
+        if self.filterset.conditions:
+            conditions.append("({})".format(self.filterset.conditions))
+            params.extend(self.filterset.params)
+        if values is not None:
+            conditions.append(self._seek_condition(ordering, values))
+            params.extend(self._seek_params(ordering, values))
+
+        filters = "{conditions} {order_by}".format(
+            conditions=" AND ".join(conditions) or 'TRUE', order_by=order_by_sql(ordering)
+        )
+        return sp_loader()[self.view_name](filters=filters, params=params, ret='all', limit=self.page_size + 1)
+
+    def _has_more(self) -> bool:
+        return len(self.rows) > self.page_size
+
+    @cached_property
+    def data(self) -> List:
+        _, reverse = self.position
+        data = self.rows[:self.page_size]
+        if reverse:
+            data.reverse()
+        return data
+
+    def _row_position(self, row: Dict) -> List:
+        return [row[field] for field, _ in self.filterset.ordering]
+
+    @cached_property
+    def url(self):
+        return self.request.build_absolute_uri()
+
+    def get_next_link(self) -> Optional[str]:
+        values, reverse = self.position
+        has_next = self._has_more() if not reverse else True
+        if not has_next or not self.data:
+            return None
+        token = self.encode_position(self._row_position(self.data[-1]), False)
+        return replace_query_param(self.url, self.cursor_param, token)
+
+    def get_previous_link(self) -> Optional[str]:
+        values, reverse = self.position
+        has_previous = self._has_more() if reverse else values is not None
+        if not has_previous:
+            return None
+        if not self.data:
+            return remove_query_param(self.url, self.cursor_param)
+        token = self.encode_position(self._row_position(self.data[0]), True)
+        return replace_query_param(self.url, self.cursor_param, token)
+
+    def response(self, serializer: Optional[Callable] = None) -> Response:
+        data = self.data
+        if serializer is not None:
+            serializer = serializer(data=data, many=True, context={'request': self.request})
+            serializer.is_valid()
+            data = serializer.data
+        return Response(
+            OrderedDict(
+                [
+                    ('next', self.get_next_link()),
+                    ('previous', self.get_previous_link()),
+                    ('results', data)
+                ]
+            )
+        )
+
+
+class StreamingJSONExport:
+    """
+    Export all filtered rows of the view as JSON array, that is encoded and sent by chunks
+
+    Rows are selected with server-side cursor by `chunk_size` rows, so neither the rows nor the whole JSON document
+    are held in memory, and the response starts before the query is finished.
+    """
+    chunk_size = 1000
+    encoder_class = DjangoJSONEncoder
+    content_type = 'application/json'
+
+    def __init__(self, view_name: str, filterset: RawSQLFilterSet, request: Optional[Request] = None,
+                 fields: str = '*'):
+        self.view_name = view_name
+        self.filterset = filterset
+        self.request = request
+        self.fields = fields
+
+    def rows(self) -> Generator:
+        filters = "{conditions} {order_by}".format(
+            conditions=self.filterset.conditions or 'TRUE', order_by=self.filterset._get_order_by()
+        )
+        return sp_loader()[self.view_name](
+            filters=filters, params=self.filterset.params, fields=self.fields, ret='stream', itersize=self.chunk_size
+        )
+
+    def chunks(self, serializer: Optional[Callable] = None) -> Generator[str, None, None]:
+        """JSON array by chunks of `chunk_size` rows, rows are passed through `serializer.to_representation`"""
+        encode = self.encoder_class(separators=(',', ':')).encode
+        to_representation = None
+        if serializer is not None:
+            to_representation = serializer(context={'request': self.request}).to_representation
+
+        yield '['
+        separator = ''
+        buffer = []
+        for row in self.rows():
+            buffer.append(encode(to_representation(row) if to_representation is not None else row))
+            if len(buffer) >= self.chunk_size:
+                yield separator + ','.join(buffer)
+                separator = ','
+                buffer = []
+        if buffer:
+            yield separator + ','.join(buffer)
+        yield ']'
+
+    def response(self, serializer: Optional[Callable] = None) -> StreamingHttpResponse:
+        return StreamingHttpResponse(self.chunks(serializer), content_type=self.content_type)
@@ -1,14 +1,32 @@
+import codecs
+import io
 import os
-import re
-from functools import partial
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from itertools import chain
-from typing import Callable, Dict, List, Optional, Tuple, TypeVar, Union
+from typing import IO, Callable, Dict, Generator, List, Optional, Tuple, TypeVar, Union
 
 from django.apps import apps
 from django.conf import settings
-from django.db import connection
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections, transaction
+from django.utils.module_loading import import_string
 
 from . import logger as base_logger
+from . import pg_stats
+from .cache import ResultCache, get_backend, make_policy, missing, parse_annotations
+from .checksums import UploadReport, checksum, ensure_table, load_checksums, store_checksum
+from .manifest import Manifest
+from .prepared import PreparedStatements
+from .procedures import StoredProcedure, View
+from .profiling import PlanStore, explain
+from .routers import ReplicaRouter
+from .rows import ROW_TYPES, make_row, make_rows
+from .signals import post_call, pre_call
+from .signatures import Signature, load_signatures
+from .sql import Statement, dependency_order, parse_definitions, split_name, split_statements
+from .stats import DEFAULT_BUCKETS, CallStats, CountingWriter, result_bytes, result_rows
 
 logger = base_logger.getChild(__name__)
 
@@ -16,17 +34,46 @@ Cursor = TypeVar('Cursor')
 
 
 class Loader:
-    REGEXP = re.compile(r'CREATE (?:OR REPLACE)? (?P<type>(?:VIEW)|(?:FUNCTION)) (?P<name>[^_]\w+)', re.MULTILINE)
     EXECUTORS = {
-        'function': '_execute_sp',
-        'view': '_execute_view'
+        'function': StoredProcedure,
+        'view': View,
+        'materialized view': View,
     }
+    RET_MODES = ('one', 'all', 'cursor', 'stream', 'numpy', 'json')
+    CACHEABLE_RET_MODES = ('one', 'all', 'numpy', 'json')
+    # noinspection SqlDialectInspection, SqlNoDataSourceInspection
+    JSON_STATEMENT = "SELECT coalesce(json_agg(t), '[]')::text FROM ({}) t"
+    DEFAULT_ITERSIZE = 2000
+    DEFAULT_PREPARED_CACHE_SIZE = 100
+    DEFAULT_ASYNC_WORKERS = 10
+    COPY_FORMATS = ('csv', 'text', 'binary')
+    COPY_CHUNK_SIZE = 65536
 
     def __init__(self, extra_files: Optional[List] = None):
         self._sp_list = []
         self._sp_names = None
+        # Names, as they are used in statements, by names of procedures
+        self._sql_names = {}
+        self._procedures = {}
+        # Names of procedures, that are set as attributes by `populate_helper`
+        self._attached = set()
+        self._signatures = None
         self._connection = None
+        self._aio = None
         self._extra_files = extra_files
+        self.manifest = Manifest(getattr(settings, 'SP_MANIFEST', None))
+        self.prepare = getattr(settings, 'SP_PREPARE', False)
+        self.itersize = getattr(settings, 'SP_ITERSIZE', self.DEFAULT_ITERSIZE)
+        self.validate_arguments = getattr(settings, 'SP_VALIDATE_ARGUMENTS', True)
+        self.router = self._get_router()
+        self.cache = ResultCache(get_backend(getattr(settings, 'SP_CACHE_BACKEND', None)))
+        self.profile_sample_rate = getattr(settings, 'SP_PROFILE_SAMPLE_RATE', 0)
+        self.plans = PlanStore()
+        self.metrics = CallStats(getattr(settings, 'SP_STATS_BUCKETS', DEFAULT_BUCKETS)) \
+            if getattr(settings, 'SP_STATS', True) else None
+        self._prepared = PreparedStatements(
+            getattr(settings, 'SP_PREPARED_CACHE_SIZE', self.DEFAULT_PREPARED_CACHE_SIZE)
+        )
 
         self._fill_sp_files_list()
         self.populate_helper()
@@ -37,6 +84,34 @@ class Loader:
             self._connection = connection
         return self._connection
 
+    @property
+    def aio(self):
+        """Async API of the loader, see `django_sp.aio.AsyncLoader`"""
+        if self._aio is None:
+            from .aio import AsyncLoader
+            self._aio = AsyncLoader(self, getattr(settings, 'SP_ASYNC_WORKERS', self.DEFAULT_ASYNC_WORKERS))
+        return self._aio
+
+    def pipeline(self, using: Optional[str] = None, combine: bool = False):
+        """Context manager, that sends queued calls in one round trip, see `django_sp.pipeline.Pipeline`"""
+        from .pipeline import Pipeline
+        return Pipeline(self, using, combine)
+
+    def get_connection(self, using: Optional[str] = None):
+        """Returns connection for the database alias, `connection` for the default one"""
+        if using is None or using == DEFAULT_DB_ALIAS:
+            return self.connection
+        return connections[using]
+
+    @staticmethod
+    def _get_router():
+        router = getattr(settings, 'SP_ROUTER', None)
+        if router is not None:
+            return import_string(router)()
+        if getattr(settings, 'SP_READ_DATABASES', None):
+            return ReplicaRouter()
+        return None
+
     def _fill_sp_files_list(self):
         sp_dir = getattr(settings, 'SP_DIR', 'sp/')
         sp_list = []
@@ -44,7 +119,7 @@ class Loader:
             app_path = app.path
             d = os.path.join(app_path, sp_dir)
             if os.access(d, os.R_OK | os.X_OK):
-                files = os.listdir(d)
+                files = self.manifest.listdir(d)
                 sp_list += [os.path.join(d, f) for f in files if f.endswith('.sql')]
 
         if self._extra_files is not None:
@@ -59,97 +134,488 @@ class Loader:
             return False
         return True
 
-    def load_sp_into_db(self):
-        with self.connection.cursor() as cursor:
+    def _file_key(self, sp_file: str) -> str:
+        """Key of the file in the checksums table: app label and path inside the app, absolute path for others"""
+        sp_file = os.path.abspath(sp_file)
+        for app in apps.get_app_configs():
+            if sp_file.startswith(os.path.join(app.path, '')):
+                return '{}:{}'.format(app.label, os.path.relpath(sp_file, app.path))
+        return sp_file
+
+    def load_sp_into_db(self, using: Optional[str] = None, force: bool = True, dry_run: bool = False,
+                        fail_silently: bool = False, jobs: int = 1) -> UploadReport:
+        """
+        Execute sql files in the database and record their checksums
+
+        Unless `force`, files with the same checksum, as on the last upload into the database, are skipped.
+        Statements of changed files are executed in dependency order (see `django_sp.sql.dependency_order`)
+        in one transaction. With `jobs` > 1 independent groups of statements are executed in parallel, every group
+        on its own connection and in its own transaction. Error rolls back the transaction, the first one is raised
+        after all groups are processed, unless `fail_silently`. On `dry_run` nothing is executed, report shows
+        what would be.
+        """
+        connection_ = self.get_connection(using)
+        report = UploadReport()
+        files = OrderedDict()
+        with connection_.cursor() as cursor:
+            known = {} if force else load_checksums(cursor)
             for sp_file in self._sp_list[:]:
                 if not self._check_file_for_reading(sp_file):
                     continue
                 with open(sp_file, 'r') as f:
-                    cursor.execute(f.read())
+                    sql = f.read()
+                key, sql_checksum = self._file_key(sp_file), checksum(sql)
+                if known.get(key) == sql_checksum:
+                    report.skipped.append(sp_file)
+                else:
+                    files[sp_file] = (key, sql_checksum, sql)
+            if dry_run or not files:
+                report.changed = list(files)
+                return report
+            ensure_table(cursor)
+
+        statements = []
+        for sp_file, (key, sql_checksum, sql) in files.items():
+            statements += split_statements(sql, sp_file)
+        groups = dependency_order(statements)
+        if jobs > 1 and connection_.in_atomic_block:
+            logger.warning('Upload runs inside transaction, so it is not parallelized')
+            jobs = 1
+
+        if jobs > 1 and len(groups) > 1:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                # Connections are per thread, so every group gets its own one
+                reports = list(executor.map(
+                    lambda group: self._upload_statements(connections[connection_.alias], group, files, close=True),
+                    groups
+                ))
+        else:
+            reports = [self._upload_statements(connection_, list(chain.from_iterable(groups)), files)]
+        for group_report in reports:
+            report.update(group_report)
+        # Files without statements
+        report.changed += [sp_file for sp_file in files if sp_file not in report]
+
+        if report.changed:
+            # Functions could be redefined, so prepared plans and signatures can't be used anymore
+            with connection_.cursor() as cursor:
+                self._prepared.invalidate(cursor, connection_.connection)
+            self.reset_signatures()
+            for name in self.cache.policies:
+                self.cache.invalidate(name)
+
+        if report.failed and not fail_silently:
+            raise next(iter(report.failed.values()))
+        return report
+
+    @staticmethod
+    def _upload_statements(connection_, statements: List[Statement], files: Dict[str, Tuple],
+                           close: bool = False) -> UploadReport:
+        """Execute statements in one transaction and store checksums of their files"""
+        report = UploadReport()
+        statement_files = list(OrderedDict.fromkeys(statement.file for statement in statements))
+        statement = None
+        try:
+            with transaction.atomic(using=connection_.alias), connection_.cursor() as cursor:
+                for statement in statements:
+                    started = time.monotonic()
+                    cursor.execute(statement.sql)
+                    report.timings.append((statement, time.monotonic() - started))
+                statement = None
+                for sp_file in statement_files:
+                    store_checksum(cursor, *files[sp_file][:2])
+        except DatabaseError as e:
+            failed_file = statement.file if statement is not None else statement_files[0]
+            logger.error('Failed to upload {}: {}'.format(
+                statement.describe() if statement is not None else failed_file, e
+            ))
+            report.failed[failed_file] = e
+            report.rolled_back = [sp_file for sp_file in statement_files if sp_file != failed_file]
+        else:
+            report.changed = statement_files
+        finally:
+            if close:
+                connection_.close()
+        return report
 
     def add_to_list(self, file_path: str):
         self._sp_list.append(file_path)
 
     def populate_helper(self):
+        for name in self._attached:
+            self.__dict__.pop(name, None)
+        self._attached = set()
+
         self._sp_names = {}
-        for sp_file in self._sp_list:
+        self._sql_names = {}
+        policies = {}
+        for sp_file in self._sp_list[:]:
             if not self._check_file_for_reading(sp_file):
                 continue
+            names, file_policies = self._parse_file(sp_file)
+            for typ, name, sql_name in names:
+                self._sp_names[name] = typ
+                self._sql_names[name] = sql_name
+            policies.update(file_policies)
+        self.manifest.save()
+
+        for name, options in getattr(settings, 'SP_CACHE', {}).items():
+            policies[name] = make_policy(options)
+        self.cache.policies = policies
+
+        self._signatures = None
+        self._procedures = {
+            name: self.EXECUTORS[typ](self, name, self._sql_names[name]) for name, typ in self._sp_names.items()
+        }
+        # Procedures, that do not clash with loader's own attributes, are set as attributes to skip `__getattr__`.
+        # Clashing ones are available by `loader[name]` only.
+        for name, procedure in self._procedures.items():
+            if not hasattr(type(self), name) and name not in vars(self):
+                self.__dict__[name] = procedure
+                self._attached.add(name)
+
+    def _parse_file(self, sp_file: str) -> Tuple[List[Tuple[str, str, str]], Dict]:
+        """
+        Returns (type, name, sql name) triples and cache policies of the file, from the manifest if file is unchanged
+        """
+        stat = self.manifest.stat(sp_file)
+        parsed = self.manifest.get(sp_file, stat)
+        if parsed is None:
             with open(sp_file, 'r') as f:
-                names = self.REGEXP.findall(f.read())
-                for typ, name in names:
-                    self._sp_names[name] = typ.lower()
+                sql = f.read()
+            names = [
+                (statement.kind, statement.name, statement.sql_name) for statement in parse_definitions(sql)
+                if not statement.name.rpartition('.')[2].startswith('_')
+            ]
+            parsed = names, parse_annotations(sql)
+            self.manifest.set(sp_file, stat, *parsed)
+        return parsed
+
+    def signatures(self, name: str) -> Optional[List[Signature]]:
+        """
+        Returns signatures of all overloads of the function or None, if they are unknown
 
-    def _execute_sp(self, *args, name: str, ret='one', **kwargs):
+        Signatures of all discovered functions are read from `pg_proc` with one query on the first call. They are
+        read regardless of `SP_VALIDATE_ARGUMENTS`, the router needs volatility of functions too.
+        """
+        if self._signatures is None:
+            names = {
+                name: split_name(self._sql_names.get(name, name)) for name, typ in self._sp_names.items()
+                if typ == 'function'
+            }
+            with self.connection.cursor() as cursor:
+                self._signatures = load_signatures(cursor, names)
+        return self._signatures.get(name)
+
+    def reset_signatures(self):
+        """Forget signatures and statements, compiled with them"""
+        self._signatures = None
+        for procedure in self._procedures.values():
+            procedure.reset()
+
+    def _execute_sp(self, *args, name: str, **kwargs):
         """
         Execute stored procedure and return result 
         
-        :param name: 
-        :param args: 
-        :param ret: One of 'one', 'all', 'cursor' or number
+        See `StoredProcedure.__call__` for arguments.
         """
-        args = [arg for arg in args if arg is not None]
+        procedure = self._find(name)
+        if procedure is None or procedure.kind != StoredProcedure.kind:
+            procedure = StoredProcedure(self, name)
+        return procedure(*args, **kwargs)
 
-        arguments = ",".join(chain(
-            ['%s' for _ in args],
-            ["{} := {}".format(name, value) for name, value in kwargs.items()]
-        ))
-        # noinspection SqlDialectInspection, SqlNoDataSourceInspection
-        statement = "SELECT * FROM {name}({arguments})".format(
-            name=name, arguments=arguments,
-        )
+    def _execute_view(self, *args, name: str, **kwargs):
+        """
+        Select from view and return result 
 
-        return self._get_res(statement, args, ret)
+        See `View.__call__` for arguments.
+        """
+        procedure = self._find(name)
+        if procedure is None or procedure.kind != View.kind:
+            procedure = View(self, name)
+        return procedure(*args, **kwargs)
+
+    def _get_res(self, statement: str, args: List, ret: Union[str, int], itersize: Optional[int] = None,
+                 prepare_key: Optional[Tuple] = None, using: Optional[str] = None,
+                 name: Optional[str] = None, row_type: str = 'dict', cache: bool = True,
+                 profile: Optional[bool] = None) -> Union[List, Dict, Cursor, Generator]:
+        """
+        Execute statement and fetch result in the `ret` way
+
+        If `prepare_key` is passed, statement is executed as prepared one, `prepare_key` identifies its shape.
+        Server-side cursors can't be declared for prepared statements, so `prepare_key` is ignored for streams.
+        Statement is executed on the `using` database alias, default one if it is None.
+        Results of the procedure `name` are cached, if there is cache policy for it and `cache` is not False.
+        Rows are returned in the `row_type` form, see `django_sp.rows.make_rows`. `ret='numpy'` returns dict of
+        NumPy arrays per column, see `django_sp.arrays.fetch_arrays`, `row_type` is ignored for it.
+        `ret='json'` returns JSON array of rows as text, built by the database.
+        Calls of named procedures are counted in `metrics` and reported with `django_sp.signals`.
+        With `profile=True` (or for `SP_PROFILE_SAMPLE_RATE` share of calls if it is None) the statement is profiled
+        before the call, that is not served from the cache, see `explain()`, the plan is kept in `plans` by
+        the procedure's name. Time of profiling is not counted in the call's duration.
+        """
+        if not isinstance(ret, int):
+            assert ret in self.RET_MODES
+        if row_type not in ROW_TYPES or (row_type == 'columns' and ret in ('one', 'stream')):
+            raise ValueError("row_type={!r} can't be used with ret={!r}".format(row_type, ret))
+        if name is None:
+            return self._execute(statement, args, ret, itersize, prepare_key, using, row_type)
+
+        procedure = self._procedures.get(name)
+        kind = procedure.kind if procedure is not None else None
+        if pre_call.receivers:
+            pre_call.send(sender=type(self), name=name, kind=kind, ret=ret)
+        res, cached, error = None, False, None
+        started = time.perf_counter()
+        try:
+            policy = self.cache.policy(name) if cache else None
+            if policy is not None and (isinstance(ret, int) or ret in self.CACHEABLE_RET_MODES):
+                key = self.cache.key(name, policy, statement, args, ret if row_type == 'dict' else (ret, row_type))
+                res = self.cache.get(key)
+                if res is missing:
+                    started += self._sample_profile(name, statement, args, using, profile)
+                    res = self._execute(statement, args, ret, itersize, prepare_key, using, row_type)
+                    self.cache.set(key, res, policy)
+                else:
+                    cached = True
+                return res
+
+            started += self._sample_profile(name, statement, args, using, profile)
+            res = self._execute(statement, args, ret, itersize, prepare_key, using, row_type)
+            return res
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._instrument(name, kind, ret, time.perf_counter() - started,
+                             result_rows(res, ret) if error is None else None,
+                             result_bytes(res, ret) if error is None else None, cached, error)
+
+    def _sample_profile(self, name: str, statement: str, args: Optional[List], using: Optional[str],
+                        profile: Optional[bool]) -> float:
+        """Profile the statement, if `profile` or sampling says so, returns time spent on profiling"""
+        if profile or (profile is None and self.profile_sample_rate and random.random() < self.profile_sample_rate):
+            started = time.perf_counter()
+            self._profile(name, statement, args, using)
+            return time.perf_counter() - started
+        return 0.0
+
+    def _instrument(self, name: str, kind: Optional[str], ret: Union[str, int], duration: float,
+                    rows: Optional[int], size: Optional[int], cached: bool = False,
+                    error: Optional[Exception] = None):
+        if self.metrics is not None:
+            self.metrics.record(name, kind, duration, rows, size, error is not None, cached)
+        if post_call.receivers:
+            post_call.send(sender=type(self), name=name, kind=kind, ret=ret, duration=duration, rows=rows,
+                           bytes=size, cached=cached, error=error)
+
+    def explain(self, statement: str, args: Optional[List] = None, using: Optional[str] = None) -> Dict:
+        """
+        Returns plan document of `EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)` for the statement
 
-    def _execute_view(self, filters: Optional[str] = None, params: Optional[List] = None, *,
-                      name: str, ret: str = 'one', fields: str = '*'):
+        The statement is executed in the savepoint, that is rolled back, so changes of VOLATILE functions are not
+        applied twice. Changes outside of the transaction (sequences, notifications, dblink) are not rolled back.
         """
-        Select from view and return result 
+        connection_ = self.get_connection(using)
+        with transaction.atomic(using=connection_.alias):
+            with connection_.cursor() as cursor:
+                plan = explain(cursor, statement, args)
+            transaction.set_rollback(True, using=connection_.alias)
+        return plan
+
+    def _profile(self, name: str, statement: str, args: Optional[List], using: Optional[str]):
+        # Profiling must not break the call, errors of the statement itself are raised by the call
+        try:
+            plan = self.explain(statement, args, using)
+        except Exception as e:
+            logger.warning("Can't profile {}: {}".format(name, e))
+            return
+        entry = self.plans.record(name, statement, plan)
+        logger.debug('Profiled {}: {:.3f} ms, buffers {}'.format(
+            name, entry['execution_time'] or 0, dict(entry['buffers'])
+        ))
 
-        :param name: 
-        :param filters: 
-        :param ret: One of 'one', 'all', 'cursor' or number
+    def server_stats(self, using: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        Statistics of the procedures and views from `pg_stat_user_functions` and `pg_stat_statements` (if the
+        extension is installed), see `django_sp.pg_stats.collect`. Times are in milliseconds.
         """
-        if filters is not None:
-            filters = filters.strip()
+        kinds = {name: procedure.kind for name, procedure in self._procedures.items()}
+        connection_ = self.get_connection(using)
+        statements = {}
+        with connection_.cursor() as cursor:
+            functions = pg_stats.function_stats(cursor, [name for name, kind in kinds.items() if kind == 'function'])
+            if pg_stats.has_pg_stat_statements(cursor):
+                try:
+                    # The view exists, but is not usable without shared_preload_libraries
+                    with transaction.atomic(using=connection_.alias):
+                        statements = pg_stats.statement_stats(cursor, {
+                            procedure.sql_name: name for name, procedure in self._procedures.items()
+                        })
+                except DatabaseError as e:
+                    logger.warning("Can't read pg_stat_statements: {}".format(e))
+        return pg_stats.collect(kinds, functions, statements)
+
+    def stats(self) -> Dict[str, Dict]:
+        """In-process statistics of calls by procedure name, see `django_sp.stats.CallStats.snapshot`"""
+        return self.metrics.snapshot() if self.metrics is not None else {}
+
+    def _execute(self, statement: str, args: List, ret: Union[str, int], itersize: Optional[int] = None,
+                 prepare_key: Optional[Tuple] = None, using: Optional[str] = None,
+                 row_type: str = 'dict') -> Union[List, Dict, Cursor, Generator]:
+        if ret == 'stream':
+            return self._get_stream(statement, args, itersize, using=using, row_type=row_type)
+
+        if ret == 'json':
+            statement = self.JSON_STATEMENT.format(statement)
+            prepare_key = prepare_key + ('json',) if prepare_key is not None else None
+
+        connection_ = self.get_connection(using)
+        cursor = connection_.cursor()
+        try:
+            if prepare_key is not None:
+                self._prepared.execute(cursor, connection_.connection, prepare_key, statement, args)
+            else:
+                cursor.execute(statement, args)
+            if ret == 'cursor':
+                return cursor
+            return self._fetch(cursor, ret, row_type)
+        finally:
+            if ret != 'cursor':
+                cursor.close()
 
-        # noinspection SqlDialectInspection, SqlNoDataSourceInspection
-        statement = "SELECT {fields} FROM {name}{where}{filters}".format(
-            name=name, filters=filters if filters else '',
-            where=' WHERE ' if filters else '',
-            fields=fields
-        )
+    def _fetch(self, cursor: Cursor, ret: Union[str, int], row_type: str = 'dict') -> Union[List, Dict, Tuple]:
+        """Fetch result of the executed statement in the `ret` way"""
+        if ret == 'json':
+            return cursor.fetchone()[0]
+        columns = self.columns_from_cursor(cursor)
+        if ret == 'numpy':
+            from .arrays import fetch_arrays
+            return fetch_arrays(cursor, columns, self.itersize)
+        if len(columns) > 0:
+            if ret == 'one':
+                return make_row(cursor.fetchone(), columns, row_type)
+            rows = cursor.fetchall() if ret == 'all' else cursor.fetchmany(ret)
+            return make_rows(rows, columns, row_type)
+
+        if ret == 'one':
+            return cursor.fetchone()
+        elif ret == 'all':
+            return [row for row in cursor]
+        return [row for row in cursor.fetchmany(ret)]
+
+    def _get_stream(self, statement: str, args: List, itersize: Optional[int] = None,
+                    using: Optional[str] = None, row_type: str = 'dict') -> Generator:
+        """
+        Execute statement on the server-side (named) cursor and return generator of rows
 
-        return self._get_res(statement, params, ret)
+        Rows are fetched from the server by `itersize` chunks, so the whole result is never held in memory.
+        Statement is executed immediately, rows are fetched while the generator is consumed.
+        """
+        if itersize is None:
+            itersize = self.itersize
 
-    def _get_res(self, statement: str, args: List, ret: Union[str, int]) -> Union[List, Dict, Cursor]:
-        if not isinstance(ret, int):
-            assert ret in ['one', 'all', 'cursor']
-        cursor = self.connection.cursor()
+        cursor = self.get_connection(using).chunked_cursor()
         try:
             cursor.execute(statement, args)
-            if ret == 'cursor':
-                return cursor
+        except Exception:
+            cursor.close()
+            raise
+        return self._iter_cursor(cursor, itersize, row_type)
 
-            columns = self.columns_from_cursor(cursor)
-            if len(columns) > 0:
-                if ret == 'one':
-                    res = self.row_to_dict(cursor.fetchone(), columns)
-                elif ret == 'all':
-                    res = [self.row_to_dict(row, columns) for row in cursor]
-                else:
-                    res = [self.row_to_dict(row, columns) for row in cursor.fetchmany(ret)]
-            else:
-                if ret == 'one':
-                    res = cursor.fetchone()
-                elif ret == 'all':
-                    res = [row for row in cursor]
+    def _iter_cursor(self, cursor: Cursor, itersize: int, row_type: str = 'dict') -> Generator:
+        try:
+            rows = cursor.fetchmany(itersize)
+            # Named cursor has no description until the first fetch
+            columns = self.columns_from_cursor(cursor) if rows else []
+            while rows:
+                if len(columns) > 0:
+                    yield from make_rows(rows, columns, row_type)
                 else:
-                    res = [row for row in cursor.fetchmany(ret)]
+                    yield from rows
+                rows = cursor.fetchmany(itersize)
         finally:
-            if ret != 'cursor':
-                cursor.close()
-        return res
+            cursor.close()
+
+    @classmethod
+    def _copy_options(cls, format: str, header: bool) -> str:
+        if format not in cls.COPY_FORMATS:
+            raise ValueError('format must be one of {}'.format(', '.join(cls.COPY_FORMATS)))
+        options = ['FORMAT {}'.format(format)]
+        if header:
+            if format != 'csv':
+                raise ValueError('header is supported for csv format only')
+            options.append('HEADER')
+        return 'WITH ({})'.format(', '.join(options))
+
+    def _copy_to(self, statement: str, args: Optional[List], fileobj: IO, format: str = 'csv',
+                 header: bool = False, using: Optional[str] = None, name: Optional[str] = None) -> int:
+        """Execute `COPY (statement) TO STDOUT` and write data to `fileobj` as it comes, returns number of rows"""
+        # noinspection SqlDialectInspection, SqlNoDataSourceInspection
+        sql = 'COPY ({}) TO STDOUT {}'.format(statement, self._copy_options(format, header))
+        connection_ = self.get_connection(using)
+        kind = self._procedures[name].kind if name in self._procedures else None
+        if name is not None and pre_call.receivers:
+            pre_call.send(sender=type(self), name=name, kind=kind, ret='copy')
+        writer = CountingWriter.wrap(fileobj)
+        rows, error = None, None
+        started = time.perf_counter()
+        try:
+            with connection_.cursor() as cursor:
+                raw_cursor = cursor.cursor
+                with connection_.wrap_database_errors:
+                    if hasattr(raw_cursor, 'copy_expert'):
+                        # psycopg2 can't pass parameters to COPY, they are interpolated on the client
+                        raw_cursor.copy_expert(raw_cursor.mogrify(sql, args) if args else sql, writer)
+                    else:
+                        decoder = None
+                        if isinstance(fileobj, io.TextIOBase):
+                            decoder = codecs.getincrementaldecoder(raw_cursor.connection.info.encoding)()
+                        with raw_cursor.copy(sql, args) as copy:
+                            for data in copy:
+                                writer.write(decoder.decode(data) if decoder is not None else data)
+                rows = raw_cursor.rowcount
+                return rows
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if name is not None:
+                self._instrument(name, kind, 'copy', time.perf_counter() - started, rows, writer.size,
+                                 error=error)
+
+    def copy_from(self, table: str, fileobj: IO, columns: Optional[List[str]] = None, format: str = 'csv',
+                  header: bool = False, using: Optional[str] = None) -> int:
+        """
+        Load data from `fileobj` into the table with COPY, e.g. staging table, that procedures consume
+
+        :param table: Table name, can be schema-qualified
+        :param fileobj: Binary or text file-like object with `read()`
+        :param columns: Columns, that data has, all table's columns by default
+        :param format: One of 'csv', 'text' or 'binary'
+        :param header: Data has header line, that is skipped, for 'csv' format only
+        :return: Number of rows loaded
+        """
+        connection_ = self.get_connection(using)
+        quote_name = connection_.ops.quote_name
+        # noinspection SqlDialectInspection, SqlNoDataSourceInspection
+        sql = 'COPY {table}{columns} FROM STDIN {options}'.format(
+            table='.'.join(quote_name(part) for part in table.split('.')),
+            columns=' ({})'.format(', '.join(quote_name(column) for column in columns)) if columns else '',
+            options=self._copy_options(format, header),
+        )
+        with connection_.cursor() as cursor:
+            raw_cursor = cursor.cursor
+            with connection_.wrap_database_errors:
+                if hasattr(raw_cursor, 'copy_expert'):
+                    raw_cursor.copy_expert(sql, fileobj)
+                else:
+                    with raw_cursor.copy(sql) as copy:
+                        data = fileobj.read(self.COPY_CHUNK_SIZE)
+                        while data:
+                            copy.write(data)
+                            data = fileobj.read(self.COPY_CHUNK_SIZE)
+            return raw_cursor.rowcount
 
     @staticmethod
     def columns_from_cursor(cursor: Cursor) -> List:
@@ -162,17 +628,24 @@ class Loader:
         else:
             return None
 
+    def _find(self, name: str) -> Optional[StoredProcedure]:
+        procedures = self.__dict__.get('_procedures', {})
+        procedure = procedures.get(name)
+        if procedure is None:
+            # Unquoted names are folded to lower case by the database, so `loader.SomeView` is `someview` view
+            procedure = procedures.get(name.lower())
+        return procedure
+
     def __getitem__(self, item: str) -> Callable:
-        if item not in self._sp_names.keys():
+        procedure = self._find(item)
+        if procedure is None:
             raise KeyError("Stored procedure {} not found".format(item))
-
-        executor = self.EXECUTORS[self._sp_names[item]]
-        func = partial(getattr(self, executor), name=item)
-        return func
+        return procedure
 
     def __getattr__(self, item: str) -> Union[Callable, object]:
-        if item in self._sp_names:
-            return self.__getitem__(item)
+        procedure = self._find(item)
+        if procedure is not None:
+            return procedure
 
         return self.__getattribute__(item)
 
@@ -180,10 +653,10 @@ class Loader:
         return len(self._sp_names)
 
     def __contains__(self, item: str) -> bool:
-        return item in self._sp_names
+        return self._find(item) is not None
 
     def list(self) -> Tuple:
         return tuple(self._sp_names.keys())
 
-    def commit(self):
-        self.connection.commit()
+    def commit(self, using: Optional[str] = None):
+        self.get_connection(using).commit()
@@ -0,0 +1,99 @@
+import json
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from django_sp.loader import Loader
+from django_sp.profiling import buffers, format_plan, percentiles
+
+
+def parse_value(value: str):
+    """Command line argument as JSON value (numbers, null, booleans, arrays), as string otherwise"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+class Command(BaseCommand):
+    help = 'Profile procedure or view: latency percentiles of several runs, plan and buffers usage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Name of the procedure or view.')
+        parser.add_argument(
+            'arguments', nargs='*', metavar='args',
+            help='Arguments of the procedure or parameters of the view filters. Values are parsed as JSON, '
+                 'strings can be passed as is.'
+        )
+        parser.add_argument(
+            '--kwarg', action='append', default=[], metavar='NAME=VALUE',
+            help='Named argument of the procedure, can be repeated.'
+        )
+        parser.add_argument('--filters', help='Conditions of WHERE clause for the view, with %%s placeholders.')
+        parser.add_argument('--runs', type=int, default=10, help='Number of runs, 10 by default.')
+        parser.add_argument('--database', help='Database alias, chosen by the router by default.')
+        parser.add_argument('--json', action='store_true', help='Print timings and plan document as JSON.')
+
+    def handle(self, *args, **options):
+        loader = Loader()
+        name = options['name']
+        if name not in loader:
+            raise CommandError('Unknown procedure or view {}'.format(name))
+        if options['runs'] < 1:
+            raise CommandError('--runs must be positive')
+
+        procedure = loader[name]
+        values = [parse_value(value) for value in options['arguments']]
+        if procedure.kind == 'view':
+            if options['kwarg']:
+                raise CommandError('Views have no named arguments')
+            statement, params = procedure._bind(options['filters'], values)
+        else:
+            if options['filters']:
+                raise CommandError('--filters can be used for views only')
+            kwargs = {}
+            for kwarg in options['kwarg']:
+                key, sep, value = kwarg.partition('=')
+                if not sep:
+                    raise CommandError('Named argument must be NAME=VALUE: {}'.format(kwarg))
+                kwargs[key] = parse_value(value)
+            statement, params = procedure._bind(*values, **kwargs)
+        using = procedure._route(options['database'])
+        alias = loader.get_connection(using).alias
+
+        # Every run is rolled back, so VOLATILE functions can be profiled on the live database
+        timings = []
+        for _ in range(options['runs']):
+            with transaction.atomic(using=alias):
+                started = time.perf_counter()
+                loader._get_res(statement, params, 'all', using=using, name=name, cache=False, profile=False)
+                timings.append((time.perf_counter() - started) * 1000)
+                transaction.set_rollback(True, using=alias)
+        plan = loader.explain(statement, params, using)
+        loader.plans.record(name, statement, plan)
+
+        latency = percentiles(timings)
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'name': name,
+                'statement': statement,
+                'timings_ms': timings,
+                'percentiles_ms': {'p{}'.format(rank): value for rank, value in latency.items()},
+                'buffers': buffers(plan),
+                'plan': plan,
+            }, indent=2, default=str))
+            return
+
+        self.stdout.write(statement)
+        self.stdout.write('{} runs: min {:.3f} ms, {}, max {:.3f} ms'.format(
+            len(timings), min(timings),
+            ', '.join('p{} {:.3f} ms'.format(rank, value) for rank, value in latency.items()), max(timings),
+        ))
+        self.stdout.write('')
+        for line in format_plan(plan):
+            self.stdout.write(line)
+        self.stdout.write('')
+        self.stdout.write('Buffers: {}'.format(
+            ', '.join('{} {}'.format(key.lower(), value) for key, value in buffers(plan).items()) or 'not reported'
+        ))
@@ -0,0 +1,58 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+
+from django_sp.loader import Loader
+from django_sp.pg_stats import ORDERINGS, diff, rank
+
+
+class Command(BaseCommand):
+    help = 'Show server-side statistics of procedures and views from pg_stat_user_functions and pg_stat_statements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', help='Database alias, the default one by default.')
+        parser.add_argument(
+            '--order-by', choices=list(ORDERINGS), default='total',
+            help='Rank by total time, mean time, calls or rows, total time by default.'
+        )
+        parser.add_argument('--limit', type=int, help='Show only first LIMIT procedures.')
+        parser.add_argument('--json', action='store_true', help='Print statistics as JSON.')
+        parser.add_argument(
+            '--save', metavar='PATH',
+            help='Save current statistics to the snapshot file, to compare with them later with --diff.'
+        )
+        parser.add_argument('--diff', metavar='PATH', help='Show statistics since the snapshot saved with --save.')
+
+    def handle(self, *args, **options):
+        loader = Loader()
+        stats = loader.server_stats(using=options['database'])
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(stats, f, indent=2)
+        if options['diff']:
+            try:
+                with open(options['diff']) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError("Can't read snapshot {}: {}".format(options['diff'], e))
+            stats = diff(stats, snapshot)
+
+        ranked = rank(stats, options['order_by'], options['limit'])
+        if options['json']:
+            self.stdout.write(json.dumps([dict(entry, name=name) for name, entry in ranked], indent=2))
+            return
+
+        if not ranked:
+            if options['diff']:
+                self.stdout.write('No calls since the snapshot')
+            else:
+                self.stdout.write('No statistics, enable track_functions or install pg_stat_statements extension')
+            return
+        self.stdout.write('{:<40} {:<8} {:>10} {:>14} {:>12} {:>12}'.format(
+            'name', 'kind', 'calls', 'total ms', 'mean ms', 'rows'
+        ))
+        for name, entry in ranked:
+            self.stdout.write('{:<40} {:<8} {:>10} {:>14.3f} {:>12.3f} {:>12}'.format(
+                name, entry['kind'], entry['calls'], entry['total_time'], entry['mean_time'],
+                '-' if entry['rows'] is None else entry['rows'],
+            ))
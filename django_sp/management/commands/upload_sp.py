@@ -1,4 +1,6 @@
-from django.core.management import BaseCommand
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
 
 from django_sp.loader import Loader
 
@@ -6,7 +8,65 @@ from django_sp.loader import Loader
 class Command(BaseCommand):
     help = 'Load stored procedures and other database stuff'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Database alias to install into, can be repeated. By default all configured PostgreSQL '
+                 'databases, except read replicas from SP_READ_DATABASES.'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Execute all files, even unchanged since the last upload.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only show files, that would be executed.'
+        )
+        parser.add_argument(
+            '--jobs', type=int, default=1,
+            help='Number of connections to upload independent groups of statements in parallel, every group '
+                 'in its own transaction. By default everything is uploaded in one transaction.'
+        )
+        parser.add_argument(
+            '--build-manifest', action='store_true',
+            help='Only write the discovery manifest to SP_MANIFEST, without touching databases.'
+        )
+
     def handle(self, *args, **options):
         loader = Loader()
-        loader.load_sp_into_db()
-        print("Available {} procedures:", len(loader))
+        if options['build_manifest']:
+            if loader.manifest.path is None:
+                raise CommandError('SP_MANIFEST setting is not set')
+            loader.manifest.save(force=True)
+            self.stdout.write("Manifest of {} procedures written to {}".format(len(loader), loader.manifest.path))
+            return
+
+        databases = options.get('databases')
+        if not databases:
+            replicas = getattr(settings, 'SP_READ_DATABASES', [])
+            databases = [
+                alias for alias in connections
+                if alias not in replicas and connections[alias].vendor == 'postgresql'
+            ]
+
+        failed = False
+        for alias in databases:
+            report = loader.load_sp_into_db(using=alias, force=options['force'], dry_run=options['dry_run'],
+                                            fail_silently=True, jobs=options['jobs'])
+            for sp_file in report.changed:
+                self.stdout.write("{} {}".format('Would execute' if options['dry_run'] else 'Executed', sp_file))
+            if options['verbosity'] > 1:
+                for sp_file in report.skipped:
+                    self.stdout.write("Skipped {}".format(sp_file))
+            if options['verbosity'] > 1:
+                for statement, seconds in sorted(report.timings, key=lambda timing: -timing[1]):
+                    self.stdout.write("{:.3f}s {}".format(seconds, statement.describe()))
+            for sp_file, error in report.failed.items():
+                self.stderr.write("Failed {}: {}".format(sp_file, error))
+            for sp_file in report.rolled_back:
+                self.stderr.write("Rolled back {}".format(sp_file))
+            failed = failed or bool(report.failed)
+            self.stdout.write("{}: {}".format(alias, report))
+        self.stdout.write("Available {} procedures".format(len(loader)))
+        if failed:
+            raise CommandError('Some files failed to upload')
@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from . import logger as base_logger
+from .cache import Policy
+
+logger = base_logger.getChild(__name__)
+
+Stat = Tuple[int, int]
+
+
+class Manifest:
+    """
+    On-disk cache of the sql files discovery: contents of `SP_DIR` directories and names, types and cache policies
+    found in every file
+
+    Entries are keyed by path and checked against mtime and size, so only changed files are read and parsed.
+    The manifest is written atomically, so workers can share it. Without `path` nothing is cached.
+    """
+    VERSION = 3
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._dirs = {}
+        self._files = {}
+        self._seen = set()
+        self._dirty = False
+        if path is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning('Manifest {} is not readable, discovering from scratch: {}'.format(self.path, e))
+            return
+        if data.get('version') != self.VERSION:
+            return
+        self._dirs = data.get('dirs', {})
+        self._files = data.get('files', {})
+
+    @staticmethod
+    def stat(path: str) -> Stat:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def listdir(self, path: str) -> List[str]:
+        """Names of files in the directory, listed again only if directory's mtime has changed"""
+        if self.path is None:
+            return os.listdir(path)
+        stat = list(self.stat(path))
+        self._seen.add(path)
+        entry = self._dirs.get(path)
+        if entry is not None and entry['stat'] == stat:
+            return entry['files']
+        files = os.listdir(path)
+        self._dirs[path] = {'stat': stat, 'files': files}
+        self._dirty = True
+        return files
+
+    def get(self, path: str, stat: Stat) -> Optional[Tuple[List[Tuple[str, str, str]], Dict[str, Policy]]]:
+        """
+        Returns (type, name, sql name) triples and cache policies of the file, None if the file is unknown or changed
+        """
+        if self.path is None:
+            return None
+        self._seen.add(path)
+        entry = self._files.get(path)
+        if entry is None or entry['stat'] != list(stat):
+            return None
+        names = [tuple(item) for item in entry['names']]
+        policies = {name: Policy(timeout, tuple(tags)) for name, (timeout, tags) in entry['policies'].items()}
+        return names, policies
+
+    def set(self, path: str, stat: Stat, names: List[Tuple[str, str, str]], policies: Dict[str, Policy]):
+        if self.path is None:
+            return
+        self._seen.add(path)
+        self._files[path] = {
+            'stat': list(stat),
+            'names': [list(item) for item in names],
+            'policies': {name: [policy.timeout, list(policy.tags)] for name, policy in policies.items()},
+        }
+        self._dirty = True
+
+    def save(self, force: bool = False):
+        """Write the manifest, if something has changed. Entries of files, that were not discovered, are dropped"""
+        if self.path is None:
+            return
+        stale = (set(self._dirs) | set(self._files)) - self._seen
+        if not (self._dirty or stale or force):
+            return
+        data = {
+            'version': self.VERSION,
+            'dirs': {path: entry for path, entry in self._dirs.items() if path in self._seen},
+            'files': {path: entry for path, entry in self._files.items() if path in self._seen},
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix='.django_sp_manifest', dir=directory)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning('Manifest {} is not writable: {}'.format(self.path, e))
+            return
+        self._dirs, self._files = data['dirs'], data['files']
+        self._dirty = False
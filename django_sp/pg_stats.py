@@ -0,0 +1,144 @@
+"""
+Server-side statistics of the loader's procedures and views from `pg_stat_user_functions` and `pg_stat_statements`
+"""
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, TypeVar
+
+from . import logger as base_logger
+
+logger = base_logger.getChild(__name__)
+
+Cursor = TypeVar('Cursor')
+
+COUNTERS = ('calls', 'total_time', 'self_time', 'rows')
+ORDERINGS = OrderedDict([
+    ('total', 'total_time'),
+    ('mean', 'mean_time'),
+    ('calls', 'calls'),
+    ('rows', 'rows'),
+])
+
+# Functions are counted only with `track_functions = pl` or `all`. Names of functions, that are not visible by
+# search_path, are schema-qualified as the loader's names are.
+# noinspection SqlDialectInspection, SqlNoDataSourceInspection
+FUNCTIONS_QUERY = """
+SELECT CASE WHEN pg_function_is_visible(funcid) THEN funcname ELSE schemaname || '.' || funcname END,
+       sum(calls), sum(total_time), sum(self_time)
+FROM pg_stat_user_functions
+GROUP BY 1
+"""
+
+# Columns were renamed in PostgreSQL 13
+# noinspection SqlDialectInspection, SqlNoDataSourceInspection
+STATEMENTS_QUERY = """
+SELECT query, calls, {total_time}, rows
+FROM pg_stat_statements
+WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+"""
+
+
+def _entry(kind: Optional[str]) -> Dict[str, Any]:
+    return OrderedDict([
+        ('kind', kind), ('calls', 0), ('total_time', 0.0), ('mean_time', 0.0), ('self_time', None), ('rows', None),
+        ('sources', []),
+    ])
+
+
+def has_pg_stat_statements(cursor: Cursor) -> bool:
+    cursor.execute("SELECT to_regclass('pg_stat_statements') IS NOT NULL")
+    return cursor.fetchone()[0]
+
+
+def function_stats(cursor: Cursor, names: Iterable[str]) -> Dict[str, tuple]:
+    """Returns (calls, total_time, self_time) of the functions by names, times are in milliseconds"""
+    names = set(names)
+    cursor.execute(FUNCTIONS_QUERY)
+    return {
+        name: (int(calls), float(total_time), float(self_time))
+        for name, calls, total_time, self_time in cursor.fetchall() if name in names
+    }
+
+
+def statement_pattern(names: Iterable[str]):
+    """Regexp, that finds the loader's procedure or view in the statement as the loader builds it"""
+    alternatives = '|'.join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+    return re.compile(r'\bFROM\s+({})(?![\w.$])'.format(alternatives), re.IGNORECASE)
+
+
+def statement_stats(cursor: Cursor, names: Dict[str, str]) -> Dict[str, tuple]:
+    """
+    Returns (calls, total_time, rows) of statements by names of the procedures and views they select from
+
+    `names` are names of the procedures by names, as they are used in statements. Statements of different filters
+    and arguments shapes of one procedure are summed up.
+    """
+    names = {sql_name.lower(): name for sql_name, name in names.items()}
+    if not names:
+        return {}
+    cursor.execute("SELECT current_setting('server_version_num')::int")
+    time_column = 'total_exec_time' if cursor.fetchone()[0] >= 130000 else 'total_time'
+    cursor.execute(STATEMENTS_QUERY.format(total_time=time_column))
+    pattern = statement_pattern(names)
+    stats = {}
+    for query, calls, time, rows in cursor.fetchall():
+        match = pattern.search(query)
+        if match is None:
+            continue
+        name = names[match.group(1).lower()]
+        total_calls, total_time, total_rows = stats.get(name, (0, 0.0, 0))
+        stats[name] = (total_calls + int(calls), total_time + float(time), total_rows + int(rows))
+    return stats
+
+
+def collect(kinds: Dict[str, str], functions: Dict[str, tuple], statements: Dict[str, tuple]) -> Dict[str, Dict]:
+    """
+    Combines statistics of the procedures and views by names, `kinds` are kinds of the loader's names
+
+    `pg_stat_user_functions` is preferred for calls and times of functions, it counts nested calls too,
+    `pg_stat_statements` is the only source for views and rows.
+    """
+    result = OrderedDict()
+    for name, kind in sorted(kinds.items()):
+        entry = _entry(kind)
+        if name in statements:
+            entry['calls'], entry['total_time'], entry['rows'] = statements[name]
+            entry['sources'].append('pg_stat_statements')
+        if name in functions:
+            entry['calls'], entry['total_time'], entry['self_time'] = functions[name]
+            entry['sources'].append('pg_stat_user_functions')
+        if entry['sources']:
+            _update_mean(entry)
+            result[name] = entry
+    return result
+
+
+def _update_mean(entry: Dict[str, Any]):
+    entry['mean_time'] = entry['total_time'] / entry['calls'] if entry['calls'] else 0.0
+
+
+def diff(current: Dict[str, Dict], snapshot: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    Statistics since the snapshot, procedures without calls since it are omitted
+
+    Counters lower than in the snapshot mean, that statistics were reset, then current values are kept.
+    """
+    result = OrderedDict()
+    for name, entry in current.items():
+        previous = snapshot.get(name)
+        entry = OrderedDict(entry)
+        if previous is not None and entry['calls'] >= previous.get('calls', 0):
+            for key in COUNTERS:
+                if entry[key] is not None and previous.get(key) is not None:
+                    entry[key] -= previous[key]
+            _update_mean(entry)
+        if entry['calls']:
+            result[name] = entry
+    return result
+
+
+def rank(stats: Dict[str, Dict], order_by: str = 'total', limit: Optional[int] = None) -> List[tuple]:
+    """(name, entry) pairs ordered by `ORDERINGS` key, the biggest first"""
+    key = ORDERINGS[order_by]
+    ranked = sorted(stats.items(), key=lambda item: (-(item[1][key] or 0), item[0]))
+    return ranked[:limit] if limit is not None else ranked
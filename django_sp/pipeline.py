@@ -0,0 +1,283 @@
+import json
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from itertools import zip_longest
+from typing import Any, List, Optional
+
+from . import logger as base_logger
+from .cache import missing
+from .rows import ROW_TYPES, make_row, make_rows
+from .signals import pre_call
+from .stats import result_bytes, result_rows
+
+logger = base_logger.getChild(__name__)
+
+
+class PendingResult:
+    """Future-like handle of the queued call, resolved when the pipeline is flushed"""
+    __slots__ = ('_result', '_exception', '_done')
+
+    def __init__(self):
+        self._result = None
+        self._exception = None
+        self._done = False
+
+    def done(self) -> bool:
+        return self._done
+
+    def result(self) -> Any:
+        """Returns result in the same shape as the direct call does, or raises the call's exception"""
+        if not self._done:
+            raise RuntimeError('Pipeline is not flushed yet')
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def set_result(self, result: Any):
+        self._result = result
+        self._done = True
+
+    def set_exception(self, exception: BaseException):
+        self._exception = exception
+        self._done = True
+
+
+class QueuedProcedure:
+    """Procedure or view callable, that queues the call into the pipeline instead of executing it"""
+    __slots__ = ('pipeline', 'procedure')
+
+    def __init__(self, pipeline: 'Pipeline', procedure):
+        self.pipeline = pipeline
+        self.procedure = procedure
+
+    def __call__(self, *args, **kwargs) -> PendingResult:
+        return self.pipeline.add(self.procedure, *args, **kwargs)
+
+
+class Pipeline:
+    """
+    Queue of independent calls, that are sent to the database in one round trip
+
+        with sp_loader().pipeline() as pipe:
+            customer = pipe.get_customer(customer_id)
+            orders = pipe.orders_view('customer_id = %s', [customer_id], ret='all')
+        customer.result(), orders.result()
+
+    Calls are sent on exit from the block (or by `flush()`) with psycopg3 pipeline mode. psycopg2 has no
+    pipeline mode and returns only the last result of multi-statement query, so there calls are executed one by one.
+    With `combine=True` they are combined into one statement instead, `SELECT (SELECT coalesce(json_agg(t), '[]')
+    FROM (<call>) t), ...`, and rows are decoded from JSON: values have JSON types (numbers are decimals, dates and
+    timestamps are strings), an error of one call fails all of them and results are not cached, except 'json' ones.
+    'numpy' `ret` calls are always executed one by one there.
+
+    Only 'one', 'all', 'numpy', 'json' and number `ret` modes can be queued. Cached results are resolved immediately
+    without queueing. Calls are executed on their `using` database or on the pipeline's one, the default one if
+    both are None, the router is not asked. `prepare`, `itersize` and `profile` of direct calls can't be used.
+
+    Errors of the calls are set to their handles, the first one is raised by `flush()` too. Calls are instrumented
+    as direct ones, their duration is the time from the start of the flush to the result of the call.
+    """
+    UNSUPPORTED_OPTIONS = ('prepare', 'itersize', 'profile')
+
+    def __init__(self, loader, using: Optional[str] = None, combine: bool = False):
+        self.loader = loader
+        self.using = using
+        self.combine = combine
+        self._queue = []
+
+    def __enter__(self) -> 'Pipeline':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self._queue = []
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def __getitem__(self, item: str) -> QueuedProcedure:
+        return QueuedProcedure(self, self.loader[item])
+
+    def __getattr__(self, item: str) -> QueuedProcedure:
+        if item.startswith('_') or item not in self.loader:
+            raise AttributeError(item)
+        return self[item]
+
+    def add(self, procedure, *args, ret='one', row_type: str = 'dict', using: Optional[str] = None,
+            **kwargs) -> PendingResult:
+        """Queue call of the procedure with the same arguments as the direct call has"""
+        if not isinstance(ret, int) and ret not in self.loader.CACHEABLE_RET_MODES:
+            raise ValueError("ret={!r} can't be used in the pipeline".format(ret))
+        if row_type not in ROW_TYPES or (row_type == 'columns' and ret == 'one'):
+            raise ValueError("row_type={!r} can't be used with ret={!r}".format(row_type, ret))
+        for option in self.UNSUPPORTED_OPTIONS:
+            if kwargs.pop(option, None) is not None:
+                raise TypeError("{} can't be used in the pipeline".format(option))
+
+        statement, params = procedure._bind(*args, **kwargs)
+        pending = PendingResult()
+        policy = self.loader.cache.policy(procedure.name)
+        key = None
+        if pre_call.receivers:
+            pre_call.send(sender=type(self.loader), name=procedure.name, kind=procedure.kind, ret=ret)
+        if policy is not None:
+            started = time.perf_counter()
+            key = self.loader.cache.key(procedure.name, policy, statement, params,
+                                        ret if row_type == 'dict' else (ret, row_type))
+            res = self.loader.cache.get(key)
+            if res is not missing:
+                pending.set_result(res)
+                self._instrument(procedure, ret, started, res, cached=True)
+                return pending
+
+        self._queue.append((procedure, statement, params, ret, row_type, key, policy,
+                            using if using is not None else self.using, pending))
+        return pending
+
+    def flush(self):
+        """Send all queued calls and resolve their handles, calls to every database in one round trip"""
+        queue, self._queue = self._queue, []
+        if not queue:
+            return
+
+        started = time.perf_counter()
+        by_database = OrderedDict()
+        for item in queue:
+            by_database.setdefault(item[7], []).append(item)
+
+        errors = []
+        for using, items in by_database.items():
+            connection_ = self.loader.get_connection(using)
+            connection_.ensure_connection()
+            if hasattr(connection_.connection, 'pipeline'):
+                errors.append(self._flush_pipelined(connection_, items, started))
+            elif self.combine:
+                errors.append(self._flush_combined(
+                    connection_, [item for item in items if item[3] != 'numpy'], started
+                ))
+                errors.append(self._flush_sequential([item for item in items if item[3] == 'numpy'], started))
+            else:
+                errors.append(self._flush_sequential(items, started))
+        error = next((error for error in errors if error is not None), None)
+        if error is not None:
+            raise error
+
+    def _instrument(self, procedure, ret, started: float, res: Any = None, cached: bool = False,
+                    error: Optional[Exception] = None):
+        ok = error is None
+        self.loader._instrument(procedure.name, procedure.kind, ret, time.perf_counter() - started,
+                                result_rows(res, ret) if ok else None, result_bytes(res, ret) if ok else None,
+                                cached, error)
+
+    def _resolve(self, item: tuple, res: Any, started: float, cache: bool = True):
+        procedure, statement, params, ret, row_type, key, policy, using, pending = item
+        if key is not None and cache:
+            self.loader.cache.set(key, res, policy)
+        pending.set_result(res)
+        self._instrument(procedure, ret, started, res)
+
+    def _reject(self, item: tuple, error: Exception, started: float):
+        pending = item[-1]
+        pending.set_exception(error)
+        self._instrument(item[0], item[3], started, error=error)
+
+    def _flush_sequential(self, queue: List[tuple], started: float) -> Optional[Exception]:
+        error = None
+        for item in queue:
+            procedure, statement, params, ret, row_type, key, policy, using, pending = item
+            try:
+                res = self.loader._execute(statement, params, ret, using=using, row_type=row_type)
+            except Exception as e:
+                error = error or e
+                self._reject(item, e, started)
+            else:
+                self._resolve(item, res, started)
+        return error
+
+    def _flush_combined(self, connection_, queue: List[tuple], started: float) -> Optional[Exception]:
+        if not queue:
+            return None
+        selects = []
+        params = []
+        for procedure, statement, item_params, ret, *_ in queue:
+            if ret == 'one' or isinstance(ret, int):
+                # noinspection SqlDialectInspection, SqlNoDataSourceInspection
+                statement = 'SELECT * FROM ({}) s LIMIT {:d}'.format(statement, 1 if ret == 'one' else ret)
+            if item_params:
+                params.extend(item_params)
+            else:
+                # The statement was not interpolated alone, but it is a part of interpolated one now
+                statement = statement.replace('%', '%%')
+            selects.append('({})'.format(self.loader.JSON_STATEMENT.format(statement)))
+
+        try:
+            with connection_.cursor() as cursor:
+                cursor.execute('SELECT {}'.format(', '.join(selects)), params)
+                documents = cursor.fetchone()
+        except Exception as e:
+            for item in queue:
+                self._reject(item, e, started)
+            return e
+
+        error = None
+        for item, document in zip(queue, documents):
+            try:
+                res = self._decode(document, item[3], item[4])
+            except Exception as e:
+                error = error or e
+                self._reject(item, e, started)
+            else:
+                # Decoded values have JSON types, the direct call must not get them from the cache
+                self._resolve(item, res, started, cache=item[3] == 'json')
+        return error
+
+    @staticmethod
+    def _decode(document: str, ret, row_type: str) -> Any:
+        """Result of the combined call from JSON array of rows in the same shape as the direct call returns"""
+        if ret == 'json':
+            return document
+        rows = json.loads(document, parse_float=Decimal)
+        columns = list(rows[0]) if rows else []
+        values = [tuple(row.values()) for row in rows]
+        if ret == 'one':
+            return make_row(values[0] if values else None, columns, row_type)
+        return make_rows(values, columns, row_type)
+
+    def _flush_pipelined(self, connection_, queue: List[tuple], started: float) -> Optional[Exception]:
+        from psycopg import Cursor as PipelineCursor
+
+        # Server-side binding cursor: client-side binding one, that Django uses by default, can't be pipelined
+        error = None
+        cursors = []
+        connection_.validate_no_broken_transaction()
+        raw_connection = connection_.connection
+        try:
+            with connection_.wrap_database_errors, raw_connection.pipeline():
+                for procedure, statement, params, ret, *_ in queue:
+                    if ret == 'json':
+                        statement = self.loader.JSON_STATEMENT.format(statement)
+                    cursor = PipelineCursor(raw_connection)
+                    cursors.append(cursor)
+                    cursor.execute(statement, params)
+        except Exception as e:
+            error = e
+
+        for item, cursor in zip_longest(queue, cursors):
+            if cursor is None:
+                # Not sent because of the previous error
+                self._reject(item, error, started)
+                continue
+            try:
+                with connection_.wrap_database_errors:
+                    res = self.loader._fetch(cursor, item[3], item[4])
+            except Exception as e:
+                error = error or e
+                self._reject(item, e, started)
+            else:
+                self._resolve(item, res, started)
+            finally:
+                cursor.close()
+        return error
@@ -0,0 +1,92 @@
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from itertools import count
+from typing import Hashable, List, Optional, Tuple, TypeVar
+
+from . import logger as base_logger
+
+logger = base_logger.getChild(__name__)
+
+Cursor = TypeVar('Cursor')
+
+PLACEHOLDER_RE = re.compile(r'%(s|%)')
+
+# Names are unique within the process, so registries of different loaders never clash on one connection
+_statement_names = count(1)
+
+
+def to_positional(statement: str) -> Tuple[str, int]:
+    """
+    Replace DB-API `%s` placeholders with PostgreSQL `$n` parameters
+
+    Returns statement and number of parameters.
+    """
+    counter = count(1)
+
+    def replace(match):
+        if match.group(1) == '%':
+            return '%'
+        return '${}'.format(next(counter))
+
+    statement = PLACEHOLDER_RE.sub(replace, statement)
+    return statement, next(counter) - 1
+
+
+class PreparedStatements:
+    """
+    Registry of statements, prepared with PREPARE on database connections
+
+    Statements are tracked per connection (prepared statement lives as long as its connection) and by the key,
+    describing statement's shape. Each connection keeps at most `size` statements, least recently used one is
+    deallocated when the limit is reached.
+    """
+
+    def __init__(self, size: int = 100):
+        self.size = size
+        self._lock = threading.Lock()
+        self._connections = weakref.WeakKeyDictionary()
+
+    def _registry(self, raw_connection) -> OrderedDict:
+        with self._lock:
+            registry = self._connections.get(raw_connection)
+            if registry is None:
+                registry = self._connections[raw_connection] = OrderedDict()
+            return registry
+
+    def execute(self, cursor: Cursor, raw_connection, key: Hashable, statement: str, params: Optional[List]):
+        """Execute `statement` as prepared one, preparing it on the connection first if needed"""
+        registry = self._registry(raw_connection)
+        name = registry.get(key)
+        if name is None:
+            name = 'django_sp_{}'.format(next(_statement_names))
+            positional, params_count = to_positional(statement)
+            cursor.execute('PREPARE {name} AS {statement}'.format(name=name, statement=positional))
+            registry[key] = name
+            if len(registry) > self.size:
+                _, evicted = registry.popitem(last=False)
+                cursor.execute('DEALLOCATE {}'.format(evicted))
+        else:
+            registry.move_to_end(key)
+            params_count = len(params or ())
+
+        if params_count:
+            cursor.execute('EXECUTE {name}({params})'.format(name=name, params=','.join(['%s'] * params_count)),
+                           params)
+        else:
+            cursor.execute('EXECUTE {}'.format(name))
+
+    def invalidate(self, cursor: Optional[Cursor] = None, raw_connection=None):
+        """
+        Forget all prepared statements
+
+        Statements on connection of the `cursor` are deallocated, statements on other connections are left to be
+        dropped with the connection, new names are used instead of them.
+        """
+        with self._lock:
+            registry = self._connections.get(raw_connection) if raw_connection is not None else None
+            self._connections.clear()
+        if cursor is not None and registry:
+            for name in registry.values():
+                cursor.execute('DEALLOCATE {}'.format(name))
@@ -0,0 +1,302 @@
+from typing import IO, Dict, Iterable, List, Optional, Tuple, Union
+
+from . import logger as base_logger
+from .signatures import compile_arguments, convert, placeholder
+from .sql import split_name
+
+logger = base_logger.getChild(__name__)
+
+
+class StoredProcedure:
+    """
+    Callable for the stored procedure
+
+    Instance is created once per procedure by the loader. SQL statement is built once for each arguments shape
+    (number of positional arguments and names of keyword arguments) and reused by subsequent calls,
+    argument values are always passed as query parameters.
+
+    If function's signature is known to the loader, shape is validated against it, placeholders get explicit
+    casts and values are converted to argument types before the query is sent.
+    """
+    __slots__ = ('loader', 'name', 'sql_name', '_statements')
+    kind = 'function'
+    # Bound for views' statements cache, as filters can be generated dynamically
+    STATEMENTS_CACHE_SIZE = 256
+    # Number of calls sent in one statement by `many`
+    DEFAULT_BATCH_SIZE = 1000
+
+    def __init__(self, loader, name: str, sql_name: Optional[str] = None):
+        self.loader = loader
+        self.name = name
+        # Name for statements, quoted parts of the name stay quoted
+        self.sql_name = sql_name or name
+        self._statements = {}
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__, self.name)
+
+    def _store_statement(self, key: Tuple, compiled):
+        if len(self._statements) >= self.STATEMENTS_CACHE_SIZE:
+            self._statements.clear()
+        self._statements[key] = compiled
+        return compiled
+
+    def reset(self):
+        self._statements.clear()
+
+    @property
+    def volatility(self) -> str:
+        """The most volatile category among function's overloads, 'volatile' if signatures are unknown"""
+        signatures = self.loader.signatures(self.name)
+        if not signatures:
+            return 'volatile'
+        volatilities = {signature.volatility for signature in signatures}
+        for volatility in ('volatile', 'stable'):
+            if volatility in volatilities:
+                return volatility
+        return 'immutable'
+
+    def _route(self, using: Optional[str]) -> Optional[str]:
+        if using is None and self.loader.router is not None:
+            return self.loader.router.db_for_call(self)
+        return using
+
+    def _compile(self, args_count: int, kwargs_names: Tuple[str, ...]) -> Tuple[List[Optional[str]], Optional[List]]:
+        signatures = self.loader.signatures(self.name) if self.loader.validate_arguments else None
+        return compile_arguments(self.name, signatures, args_count, kwargs_names)
+
+    @staticmethod
+    def _arguments(values: List[str], kwargs_names: Tuple[str, ...]) -> str:
+        """Join argument values, last `kwargs_names` of them are passed as named ones"""
+        positional = len(values) - len(kwargs_names)
+        return ",".join(values[:positional] + [
+            '{} := {}'.format(kwarg, value) for kwarg, value in zip(kwargs_names, values[positional:])
+        ])
+
+    def statement(self, args_count: int, kwargs_names: Tuple[str, ...]) -> Tuple[str, Optional[List]]:
+        """Returns cached statement and value converters for the arguments shape"""
+        key = (args_count, kwargs_names)
+        compiled = self._statements.get(key)
+        if compiled is None:
+            types, converters = self._compile(args_count, kwargs_names)
+            # noinspection SqlDialectInspection, SqlNoDataSourceInspection
+            statement = "SELECT * FROM {name}({arguments})".format(
+                name=self.sql_name, arguments=self._arguments([placeholder(type_) for type_ in types], kwargs_names),
+            )
+            compiled = self._store_statement(key, (statement, converters))
+        return compiled
+
+    def __call__(self, *args, ret: Union[str, int] = 'one', itersize: Optional[int] = None,
+                 prepare: Optional[bool] = None, using: Optional[str] = None, row_type: str = 'dict',
+                 profile: Optional[bool] = None, **kwargs):
+        """
+        Execute stored procedure and return result
+
+        :param args: Positional arguments, `None` values are skipped
+        :param kwargs: Named arguments
+        :param ret: One of 'one', 'all', 'cursor', 'stream', 'numpy', 'json' or number
+        :param itersize: Rows per fetch for `ret='stream'`
+        :param prepare: Execute as prepared statement, `SP_PREPARE` setting by default
+        :param using: Database alias, chosen by the loader's router by default
+        :param row_type: One of 'dict', 'tuple', 'record' (namedtuple) or 'columns' (dict of values lists)
+        :param profile: Record plan of the call with EXPLAIN ANALYZE, `SP_PROFILE_SAMPLE_RATE` decides by default
+        """
+        statement, params = self._bind(*args, **kwargs)
+        if prepare is None:
+            prepare = self.loader.prepare
+        return self.loader._get_res(statement, params, ret, itersize=itersize,
+                                    prepare_key=(self.name, statement) if prepare else None,
+                                    using=self._route(using), name=self.name, row_type=row_type, profile=profile)
+
+    def _bind(self, *args, **kwargs) -> Tuple[str, List]:
+        """Returns statement and its parameters for the call arguments"""
+        params = [arg for arg in args if arg is not None]
+        args_count = len(params)
+        kwargs_names = ()
+        if kwargs:
+            kwargs_names = tuple(kwargs)
+            params.extend(kwargs.values())
+
+        statement, converters = self.statement(args_count, kwargs_names)
+        if converters is not None:
+            convert(self.name, params, converters)
+        return statement, params
+
+    def copy_to(self, fileobj: IO, *args, format: str = 'csv', header: bool = False, using: Optional[str] = None,
+                **kwargs) -> int:
+        """
+        Write result of the call to `fileobj` with COPY, without Python objects for rows
+
+        :param fileobj: Binary or text file-like object with `write()`
+        :param format: One of 'csv', 'text' or 'binary'
+        :param header: Write header line, for 'csv' format only
+        :return: Number of rows written
+        """
+        statement, params = self._bind(*args, **kwargs)
+        return self.loader._copy_to(statement, params, fileobj, format, header, using=self._route(using),
+                                     name=self.name)
+
+    def many(self, arguments: Iterable[Union[Tuple, Dict]], ret: str = 'one', batch_size: Optional[int] = None,
+             using: Optional[str] = None) -> List:
+        """
+        Call procedure for every item of `arguments`, sending one statement per `batch_size` items
+
+        Items are tuples of positional arguments or dicts of named ones, all of them must have the same shape.
+        Unlike the single call, `None` values are passed as NULL. Returns results in the order of `arguments`:
+        row (or None) per item for `ret='one'`, list of rows per item for `ret='all'`.
+        """
+        assert ret in ('one', 'all')
+        arguments = list(arguments)
+        if not arguments:
+            return []
+
+        kwargs_names = tuple(arguments[0]) if isinstance(arguments[0], dict) else ()
+        args_count = 0 if kwargs_names else len(arguments[0])
+        types, converters = self._compile(args_count, kwargs_names)
+        columns = ['__sp_{}'.format(i) for i in range(len(types))]
+
+        # Fixed alias, the name can be schema-qualified or quoted. Column of scalar function gets the alias name,
+        # it is renamed back to the function name, as the single call returns it.
+        if all(types):
+            row_placeholder = '({})'.format(','.join(['%s::int'] + [placeholder(type_) for type_ in types]))
+            # noinspection SqlDialectInspection, SqlNoDataSourceInspection
+            template = (
+                "SELECT v.__sp_n, __sp_r.* FROM (VALUES {{rows}}) AS v(__sp_n{columns}) "
+                "CROSS JOIN LATERAL {name}({arguments}) AS __sp_r ORDER BY v.__sp_n"
+            ).format(
+                name=self.sql_name, columns=''.join(',' + column for column in columns),
+                arguments=self._arguments(['v.' + column for column in columns], kwargs_names),
+            )
+
+            def build(count: int) -> str:
+                return template.format(rows=','.join([row_placeholder] * count))
+        else:
+            # Columns of VALUES without types would be text, so arguments of unknown types are passed to
+            # a call per item, that resolves them as the single call does
+            # noinspection SqlDialectInspection, SqlNoDataSourceInspection
+            call = "SELECT %s::int AS __sp_n, __sp_r.* FROM {name}({arguments}) AS __sp_r".format(
+                name=self.sql_name, arguments=self._arguments([placeholder(type_) for type_ in types], kwargs_names),
+            )
+
+            def build(count: int) -> str:
+                return '{} ORDER BY __sp_n'.format(' UNION ALL '.join([call] * count))
+
+        scalar_column = split_name(self.sql_name)[-1]
+        using = self._route(using)
+        batch_size = batch_size or self.DEFAULT_BATCH_SIZE
+        results = []
+        for start in range(0, len(arguments), batch_size):
+            batch = arguments[start:start + batch_size]
+            params = []
+            for n, item in enumerate(batch):
+                if kwargs_names:
+                    if not isinstance(item, dict) or set(item) != set(kwargs_names):
+                        raise ValueError('All arguments of {}.many() must have the same shape'.format(self.name))
+                    values = [item[kwarg] for kwarg in kwargs_names]
+                else:
+                    if isinstance(item, dict) or len(item) != args_count:
+                        raise ValueError('All arguments of {}.many() must have the same shape'.format(self.name))
+                    values = list(item)
+                if converters is not None:
+                    convert(self.name, values, converters)
+                params.append(n)
+                params.extend(values)
+
+            rows = self.loader._get_res(build(len(batch)), params, 'all', using=using, name=self.name, cache=False)
+            grouped = [[] for _ in batch]
+            for row in rows:
+                if '__sp_r' in row:
+                    row[scalar_column] = row.pop('__sp_r')
+                grouped[row.pop('__sp_n')].append(row)
+            if ret == 'one':
+                results.extend(group[0] if group else None for group in grouped)
+            else:
+                results.extend(grouped)
+        return results
+
+
+class View(StoredProcedure):
+    """
+    Callable for the view
+
+    Statements are cached by the selected fields, filters and presence of LIMIT/OFFSET.
+    """
+    __slots__ = ()
+    kind = 'view'
+    volatility = 'stable'
+
+    def many(self, *args, **kwargs):
+        raise TypeError("many() is not supported for views, select all rows with filters instead")
+
+    def copy_to(self, fileobj: IO, filters: Optional[str] = None, params: Optional[List] = None, *,
+                format: str = 'csv', header: bool = False, fields: str = '*', limit: Optional[int] = None,
+                offset: Optional[int] = None, using: Optional[str] = None) -> int:
+        """
+        Write selected rows to `fileobj` with COPY, without Python objects for rows
+
+        :param fileobj: Binary or text file-like object with `write()`
+        :param format: One of 'csv', 'text' or 'binary'
+        :param header: Write header line, for 'csv' format only
+        :return: Number of rows written
+        """
+        statement, params = self._bind(filters, params, fields=fields, limit=limit, offset=offset)
+        return self.loader._copy_to(statement, params, fileobj, format, header, using=self._route(using),
+                                     name=self.name)
+
+    def statement(self, fields: str, filters: Optional[str], limit: bool, offset: bool) -> str:
+        key = (fields, filters, limit, offset)
+        statement = self._statements.get(key)
+        if statement is None:
+            if filters is not None:
+                filters = filters.strip()
+
+            # noinspection SqlDialectInspection, SqlNoDataSourceInspection
+            statement = "SELECT {fields} FROM {name}{where}{filters}".format(
+                name=self.sql_name, filters=filters if filters else '',
+                where=' WHERE ' if filters else '',
+                fields=fields
+            )
+            if limit:
+                statement += ' LIMIT %s'
+            if offset:
+                statement += ' OFFSET %s'
+            statement = self._store_statement(key, statement)
+        return statement
+
+    def __call__(self, filters: Optional[str] = None, params: Optional[List] = None, *,
+                 ret: Union[str, int] = 'one', fields: str = '*', itersize: Optional[int] = None,
+                 limit: Optional[int] = None, offset: Optional[int] = None, prepare: Optional[bool] = None,
+                 using: Optional[str] = None, row_type: str = 'dict', profile: Optional[bool] = None):
+        """
+        Select from view and return result
+
+        :param filters: Conditions for WHERE clause with %s placeholders for `params`
+        :param params: Values for placeholders in `filters`
+        :param ret: One of 'one', 'all', 'cursor', 'stream', 'numpy', 'json' or number
+        :param fields: Fields to select
+        :param itersize: Rows per fetch for `ret='stream'`
+        :param limit: Append LIMIT clause to the statement
+        :param offset: Append OFFSET clause to the statement
+        :param prepare: Execute as prepared statement, `SP_PREPARE` setting by default
+        :param using: Database alias, chosen by the loader's router by default
+        :param row_type: One of 'dict', 'tuple', 'record' (namedtuple) or 'columns' (dict of values lists)
+        :param profile: Record plan of the query with EXPLAIN ANALYZE, `SP_PROFILE_SAMPLE_RATE` decides by default
+        """
+        statement, params = self._bind(filters, params, fields=fields, limit=limit, offset=offset)
+        if prepare is None:
+            prepare = self.loader.prepare
+        return self.loader._get_res(statement, params, ret, itersize=itersize,
+                                    prepare_key=(self.name, statement) if prepare else None,
+                                    using=self._route(using), name=self.name, row_type=row_type, profile=profile)
+
+    def _bind(self, filters: Optional[str] = None, params: Optional[List] = None, *, fields: str = '*',
+              limit: Optional[int] = None, offset: Optional[int] = None) -> Tuple[str, Optional[List]]:
+        """Returns statement and its parameters for the call arguments"""
+        statement = self.statement(fields, filters, limit is not None, bool(offset))
+        if limit is not None or offset:
+            params = list(params or [])
+            if limit is not None:
+                params.append(limit)
+            if offset:
+                params.append(offset)
+        return statement, params
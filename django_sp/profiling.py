@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, TypeVar
+
+from . import logger as base_logger
+
+logger = base_logger.getChild(__name__)
+
+Cursor = TypeVar('Cursor')
+
+# noinspection SqlDialectInspection, SqlNoDataSourceInspection
+EXPLAIN_STATEMENT = 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {}'
+
+BUFFER_KEYS = (
+    'Shared Hit Blocks', 'Shared Read Blocks', 'Shared Dirtied Blocks', 'Shared Written Blocks',
+    'Local Hit Blocks', 'Local Read Blocks', 'Temp Read Blocks', 'Temp Written Blocks',
+)
+
+
+def explain(cursor: Cursor, statement: str, args: Optional[List]) -> Dict[str, Any]:
+    """
+    Execute the statement under `EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)` and return the plan document
+
+    The statement is really executed, callers must roll it back, if it changes something.
+    """
+    cursor.execute(EXPLAIN_STATEMENT.format(statement), args)
+    document = cursor.fetchone()[0]
+    if isinstance(document, (str, bytes)):
+        # psycopg2 returns json of EXPLAIN as text for some server versions
+        document = json.loads(document)
+    return document[0]
+
+
+def buffers(plan: Dict[str, Any]) -> Dict[str, int]:
+    """Buffers usage of the whole statement, counters of the top node include ones of the children"""
+    node = plan.get('Plan', {})
+    return OrderedDict((key, node[key]) for key in BUFFER_KEYS if key in node)
+
+
+def percentiles(values: Sequence[float], ranks: Iterable[int] = (50, 90, 95, 99)) -> Dict[int, float]:
+    """Nearest-rank percentiles of the values"""
+    values = sorted(values)
+    if not values:
+        return OrderedDict((rank, 0.0) for rank in ranks)
+    return OrderedDict(
+        (rank, values[max(0, min(len(values), -(-rank * len(values) // 100)) - 1)]) for rank in ranks
+    )
+
+
+def format_plan(plan: Dict[str, Any]) -> List[str]:
+    """Plan document as indented lines, close to the text format of EXPLAIN"""
+    lines = []
+
+    def walk(node: Dict[str, Any], depth: int):
+        title = node.get('Node Type', '?')
+        for key, template in (('Relation Name', ' on {}'), ('Function Name', ' on {}'), ('Index Name', ' using {}')):
+            if key in node:
+                title += template.format(node[key])
+        title += ' (actual time={:.3f}..{:.3f} rows={} loops={})'.format(
+            node.get('Actual Startup Time', 0), node.get('Actual Total Time', 0),
+            node.get('Actual Rows', 0), node.get('Actual Loops', 0),
+        )
+        lines.append('{}{}'.format('  ' * depth + ('-> ' if depth else ''), title))
+        for child in node.get('Plans', ()):
+            walk(child, depth + 1)
+
+    walk(plan.get('Plan', {}), 0)
+    for key in ('Planning Time', 'Execution Time'):
+        if key in plan:
+            lines.append('{}: {:.3f} ms'.format(key, plan[key]))
+    return lines
+
+
+class PlanStore:
+    """
+    The latest plan of every profiled procedure
+
+    Plans are kept in the process, `get(name)` returns dict with statement, plan document, buffers,
+    planning and execution times (ms) and the time of profiling.
+    """
+
+    def __init__(self):
+        self._plans = {}  # type: Dict[str, Dict[str, Any]]
+        self._lock = threading.Lock()
+
+    def record(self, name: str, statement: str, plan: Dict[str, Any]) -> Dict[str, Any]:
+        entry = {
+            'statement': statement,
+            'plan': plan,
+            'buffers': buffers(plan),
+            'planning_time': plan.get('Planning Time'),
+            'execution_time': plan.get('Execution Time'),
+            'profiled_at': time.time(),
+        }
+        with self._lock:
+            self._plans[name] = entry
+        return entry
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        return self._plans.get(name)
+
+    def items(self) -> List:
+        with self._lock:
+            return sorted(self._plans.items())
+
+    def clear(self):
+        with self._lock:
+            self._plans = {}
@@ -0,0 +1,35 @@
+import random
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import logger as base_logger
+
+logger = base_logger.getChild(__name__)
+
+
+class ReplicaRouter:
+    """
+    Default router for procedures and views calls
+
+    Views and STABLE/IMMUTABLE functions are sent to one of the `SP_READ_DATABASES` aliases, VOLATILE functions
+    and functions with unknown signature stay on the primary. Inside transaction on the primary everything stays
+    there too, so the call sees uncommitted changes.
+
+    Custom router can be set with `SP_ROUTER` setting, it must implement `db_for_call(procedure)` and return
+    database alias or None for the primary.
+    """
+
+    def __init__(self, replicas: Optional[List[str]] = None, primary: str = DEFAULT_DB_ALIAS):
+        if replicas is None:
+            replicas = getattr(settings, 'SP_READ_DATABASES', [])
+        self.replicas = list(replicas)
+        self.primary = primary
+
+    def db_for_call(self, procedure) -> Optional[str]:
+        if not self.replicas or connections[self.primary].in_atomic_block:
+            return None
+        if procedure.volatility == 'volatile':
+            return None
+        return random.choice(self.replicas)
@@ -0,0 +1,58 @@
+from collections import namedtuple
+from functools import lru_cache, partial
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+ROW_TYPES = ('dict', 'tuple', 'record', 'columns')
+
+
+def _make_record(columns: Tuple[str, ...], values: Tuple) -> tuple:
+    return record_class(columns)._make(values)
+
+
+@lru_cache(maxsize=256)
+def record_class(columns: Tuple[str, ...]) -> type:
+    """
+    Returns namedtuple class for the columns set, created once per set
+
+    Columns, that are not valid identifiers, are renamed to `_<position>`, values are still accessible by index.
+    Records are pickled by columns and values, so they can be cached by any backend.
+    """
+    base = namedtuple('Record', columns, rename=True)
+    return type('Record', (base,), {
+        '__slots__': (),
+        '_columns': columns,
+        '__reduce__': lambda self: (_make_record, (self._columns, tuple(self))),
+    })
+
+
+def make_row(row: Optional[Sequence], columns: List[str], row_type: str = 'dict') -> Union[Dict, Tuple, None]:
+    """Single row in the `row_type` form, `'columns'` form is not defined for one row"""
+    if row is None:
+        return None
+    if row_type == 'dict':
+        return dict(zip(columns, row))
+    elif row_type == 'tuple':
+        return tuple(row)
+    elif row_type == 'record':
+        return record_class(tuple(columns))._make(row)
+    raise ValueError("row_type={!r} can't be used for single row".format(row_type))
+
+
+def make_rows(rows: Iterable[Sequence], columns: List[str],
+              row_type: str = 'dict') -> Union[List[Dict], List[Tuple], Dict[str, List]]:
+    """
+    Rows in the `row_type` form
+
+    'dict' is list of dicts, 'tuple' is list of tuples as the driver returns them, 'record' is list of namedtuples
+    and 'columns' is dict of columns' values lists.
+    """
+    if row_type == 'dict':
+        return [dict(zip(columns, row)) for row in rows]
+    elif row_type == 'tuple':
+        return [tuple(row) for row in rows]
+    elif row_type == 'record':
+        return list(map(partial(tuple.__new__, record_class(tuple(columns))), rows))
+    elif row_type == 'columns':
+        values = list(zip(*rows)) or [()] * len(columns)
+        return {column: list(column_values) for column, column_values in zip(columns, values)}
+    raise ValueError('row_type must be one of {}'.format(', '.join(ROW_TYPES)))
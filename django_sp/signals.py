@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+# Sent before every call of procedure or view, sender is the loader's class.
+# Arguments: name, kind ('function' or 'view'), ret ('copy' for `copy_to()`).
+pre_call = Signal()
+
+# Sent after every call, also failed or served from the result cache.
+# Arguments: name, kind, ret, duration (seconds), rows (None if unknown, e.g. for streams and cursors),
+# bytes (size of 'json' and COPY results, None for others), cached, error (exception or None).
+post_call = Signal()
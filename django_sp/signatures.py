@@ -0,0 +1,206 @@
+from collections import namedtuple
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from . import logger as base_logger
+
+logger = base_logger.getChild(__name__)
+
+Cursor = TypeVar('Cursor')
+
+# noinspection SqlDialectInspection, SqlNoDataSourceInspection
+SIGNATURES_QUERY = """
+SELECT n.nspname, pg_function_is_visible(p.oid),
+       p.proname, p.provolatile, p.proretset, p.pronargdefaults, p.proargnames, p.proargmodes::text[],
+       ARRAY(
+           SELECT CASE WHEN t.typtype = 'p' THEN NULL ELSE format_type(t.oid, NULL) END
+           FROM unnest(coalesce(p.proallargtypes, p.proargtypes::oid[])) WITH ORDINALITY AS a(oid, n)
+           JOIN pg_type t ON t.oid = a.oid
+           ORDER BY a.n
+       )
+FROM pg_proc p
+JOIN pg_namespace n ON n.oid = p.pronamespace
+WHERE p.proname = ANY(%s)
+"""
+
+INPUT_MODES = ('i', 'b', 'v')
+
+Argument = namedtuple('Argument', ('name', 'type', 'has_default'))
+Converter = Optional[Callable[[Any], Any]]
+
+
+def _to_int(value: Any) -> int:
+    """Integers and strings of them, floats and decimals only with integral values, so nothing is truncated"""
+    if isinstance(value, bool) or not isinstance(value, (int, str, float, Decimal)):
+        raise ValueError('integer value expected')
+    if isinstance(value, (float, Decimal)):
+        try:
+            integral = value == int(value)
+        except (ArithmeticError, ValueError):
+            integral = False
+        if not integral:
+            raise ValueError('integer value expected')
+    return int(value)
+
+
+def _to_decimal(value: Any) -> Decimal:
+    if isinstance(value, bool) or not isinstance(value, (int, str, float, Decimal)):
+        raise ValueError('numeric value expected')
+    try:
+        # repr() is the shortest form of the float, 0.1 becomes 0.1, not its exact binary value
+        return Decimal(repr(value) if isinstance(value, float) else value)
+    except ArithmeticError:
+        raise ValueError('numeric value expected')
+
+
+def _to_float(value: Any) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, str, float, Decimal)):
+        raise ValueError('float value expected')
+    return float(value)
+
+
+BOOLEAN_LITERALS = {
+    't': True, 'true': True, 'y': True, 'yes': True, 'on': True, '1': True,
+    'f': False, 'false': False, 'n': False, 'no': False, 'off': False, '0': False,
+}
+
+
+def _to_bool(value: Any) -> bool:
+    """Booleans and strings, that PostgreSQL accepts as boolean"""
+    if isinstance(value, str):
+        try:
+            return BOOLEAN_LITERALS[value.strip().lower()]
+        except KeyError:
+            raise ValueError('boolean value expected')
+    if not isinstance(value, bool):
+        raise ValueError('boolean value expected')
+    return value
+
+
+CONVERTERS = {
+    'smallint': _to_int,
+    'integer': _to_int,
+    'bigint': _to_int,
+    'numeric': _to_decimal,
+    'real': _to_float,
+    'double precision': _to_float,
+    'boolean': _to_bool,
+}  # type: Dict[str, Callable[[Any], Any]]
+
+
+class Signature:
+    """Input arguments and properties of the function, read from `pg_proc`"""
+    __slots__ = ('name', 'arguments', 'volatility', 'returns_set', 'variadic')
+    VOLATILITY = {'i': 'immutable', 's': 'stable', 'v': 'volatile'}
+
+    def __init__(self, name: str, arguments: List[Argument], volatility: str, returns_set: bool,
+                 variadic: bool = False):
+        self.name = name
+        self.arguments = arguments
+        self.volatility = volatility
+        self.returns_set = returns_set
+        self.variadic = variadic
+
+    def __repr__(self):
+        return '{}({})'.format(self.name, ', '.join(
+            '{} {}'.format(a.name, a.type or 'any') if a.name else a.type or 'any' for a in self.arguments
+        ))
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> 'Signature':
+        name, volatility, returns_set, defaults_count, arg_names, arg_modes, arg_types = row
+        arg_modes = arg_modes or ['i'] * len(arg_types)
+        arg_names = arg_names or [''] * len(arg_types)
+
+        inputs = [
+            (arg_name, arg_type)
+            for arg_name, arg_type, mode in zip(arg_names, arg_types, arg_modes)
+            if mode in INPUT_MODES
+        ]
+        first_default = len(inputs) - (defaults_count or 0)
+        arguments = [
+            Argument(arg_name, arg_type, i >= first_default)
+            for i, (arg_name, arg_type) in enumerate(inputs)
+        ]
+        return cls(name, arguments, cls.VOLATILITY.get(volatility, 'volatile'), returns_set,
+                   variadic='v' in arg_modes)
+
+    def bind(self, args_count: int, kwargs_names: Tuple[str, ...]) -> Optional[List[Argument]]:
+        """
+        Match arguments shape against the signature
+
+        Returns arguments in order of parameters (positional first, then named) or None if shape does not match.
+        """
+        if self.variadic or args_count > len(self.arguments):
+            return None
+
+        rest = {argument.name: argument for argument in self.arguments[args_count:] if argument.name}
+        if any(name not in rest for name in kwargs_names):
+            return None
+        if any(not argument.has_default and argument.name not in kwargs_names
+               for argument in self.arguments[args_count:]):
+            return None
+
+        return self.arguments[:args_count] + [rest[name] for name in kwargs_names]
+
+
+def load_signatures(cursor: Cursor, names: Dict[str, Sequence[str]]) -> Dict[str, List[Signature]]:
+    """
+    Read signatures of all overloads of functions by their names
+
+    `names` are parts of the names (schema and function name or function name only) by names. Functions without
+    schema are looked up by search_path, as the call finds them.
+    """
+    by_proname = {}
+    for name, parts in names.items():
+        by_proname.setdefault(parts[-1], []).append((name, parts[0] if len(parts) > 1 else None))
+
+    signatures = {}
+    cursor.execute(SIGNATURES_QUERY, (list(by_proname),))
+    for row in cursor.fetchall():
+        schema, visible, proname = row[:3]
+        for name, name_schema in by_proname.get(proname, ()):
+            if name_schema == schema or (name_schema is None and visible):
+                signatures.setdefault(name, []).append(Signature.from_row((name,) + tuple(row[3:])))
+    return signatures
+
+
+def compile_arguments(name: str, signatures: Optional[List[Signature]], args_count: int,
+                      kwargs_names: Tuple[str, ...]) -> Tuple[List[Optional[str]], Optional[List[Converter]]]:
+    """
+    Returns types for explicit casts and value converters for the arguments shape
+
+    Types are known, when shape matches exactly one overload, so the database does not resolve overloads
+    on every call. Raises TypeError when signatures are known and none of them matches.
+    """
+    no_types = [None] * (args_count + len(kwargs_names))
+    if signatures is None:
+        return no_types, None
+
+    matched = [arguments for arguments in (s.bind(args_count, kwargs_names) for s in signatures)
+               if arguments is not None]
+    if not matched and not any(s.variadic for s in signatures):
+        raise TypeError("{name}() can't be called with {args} positional argument(s) and named argument(s): "
+                        "{kwargs}; known signatures: {signatures}".format(
+                            name=name, args=args_count, kwargs=', '.join(kwargs_names) or '-',
+                            signatures=', '.join(repr(s) for s in signatures)))
+    if len(matched) != 1:
+        return no_types, None
+
+    converters = [CONVERTERS.get(argument.type) for argument in matched[0]]
+    return [argument.type for argument in matched[0]], converters if any(converters) else None
+
+
+def placeholder(type_: Optional[str]) -> str:
+    return '%s::{}'.format(type_) if type_ else '%s'
+
+
+def convert(name: str, params: List, converters: List[Optional[Callable]]) -> List:
+    """Convert `params` in place, raising ValueError with the procedure name for bad values"""
+    for i, (value, converter) in enumerate(zip(params, converters)):
+        if converter is not None and value is not None:
+            try:
+                params[i] = converter(value)
+            except (TypeError, ValueError) as e:
+                raise ValueError('{}(): bad value {!r} for argument {}: {}'.format(name, value, i + 1, e))
+    return params
@@ -0,0 +1,317 @@
+import heapq
+import re
+from collections import namedtuple
+from typing import Dict, Iterator, List, Optional, Set
+
+from . import logger as base_logger
+
+logger = base_logger.getChild(__name__)
+
+Token = namedtuple('Token', ('kind', 'value', 'start'))
+
+TOKEN_RE = re.compile(r"""
+    (?P<line_comment>--[^\n]*)
+  | (?P<block_comment>/\*)
+  | (?P<dollar>\$(?:[A-Za-z_][A-Za-z_0-9]*)?\$)
+  | (?P<string>[Ee]'(?:''|\\.|[^'\\])*'|'(?:''|[^'])*')
+  | (?P<quoted_ident>"(?:""|[^"])*")
+  | (?P<ident>[A-Za-z_][A-Za-z_0-9$]*)
+  | (?P<semicolon>;)
+  | (?P<space>\s+)
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+SKIPPED_KINDS = ('space', 'comment')
+
+# Object types, that are callable through the loader, by the words after CREATE [OR REPLACE]
+DEFINITION_KINDS = {
+    ('FUNCTION',): 'function',
+    ('VIEW',): 'view',
+    ('MATERIALIZED', 'VIEW'): 'materialized view',
+}
+# Other objects, that statements can depend on, they are not exposed by the loader
+OBJECT_KINDS = {
+    ('TABLE',): 'table',
+    ('TYPE',): 'type',
+    ('DOMAIN',): 'domain',
+    ('SEQUENCE',): 'sequence',
+    ('SCHEMA',): 'schema',
+}
+DEFINITION_MODIFIERS = ('TEMP', 'TEMPORARY', 'RECURSIVE', 'UNLOGGED')
+
+
+def tokenize(sql: str) -> Iterator[Token]:
+    """
+    Split sql into tokens: comments, strings, dollar-quoted strings and quoted identifiers are single tokens,
+    so semicolons and keywords inside them are not seen
+    """
+    pos = 0
+    length = len(sql)
+    while pos < length:
+        match = TOKEN_RE.match(sql, pos)
+        kind = match.lastgroup
+        end = match.end()
+        if kind == 'block_comment':
+            # Block comments can be nested
+            depth = 1
+            while depth and end < length:
+                if sql.startswith('/*', end):
+                    depth += 1
+                    end += 2
+                elif sql.startswith('*/', end):
+                    depth -= 1
+                    end += 2
+                else:
+                    end += 1
+            kind = 'comment'
+        elif kind == 'line_comment':
+            kind = 'comment'
+        elif kind == 'dollar':
+            closing = sql.find(match.group(), end)
+            end = length if closing == -1 else closing + len(match.group())
+        yield Token(kind, sql[pos:end], pos)
+        pos = end
+
+
+def identifier(token: Token) -> str:
+    """Name of the identifier as the database sees it: unquoted ones are folded to lower case"""
+    if token.kind == 'quoted_ident':
+        return token.value[1:-1].replace('""', '"')
+    return token.value.lower()
+
+
+def split_name(name: str) -> List[str]:
+    """Parts of the qualified name, as it is written in sql, as the database sees them"""
+    return [identifier(token) for token in tokenize(name) if token.kind in ('ident', 'quoted_ident')]
+
+
+def dollar_body(token: Token) -> str:
+    tag_length = token.value.index('$', 1) + 1
+    return token.value[tag_length:-tag_length]
+
+
+class Statement:
+    """
+    Single statement of the sql file
+
+    `kind` and `name` are set for definitions of functions, views and materialized views, schema-qualified names
+    are kept qualified. `name` is the name as the database sees it, `sql_name` is the name to use in statements,
+    with quoted parts kept quoted. `defines` is the name of any created object, including tables, types, domains,
+    sequences and schemas. `references` are names, that are used in the statement, including bodies of functions.
+    """
+    __slots__ = ('sql', 'file', 'line', 'index', 'tokens', 'kind', 'name', 'sql_name', 'defines', 'comments',
+                 '_references')
+
+    def __init__(self, sql: str, tokens: List[Token], file: Optional[str] = None, line: int = 1, index: int = 0):
+        self.sql = sql
+        self.file = file
+        self.line = line
+        self.index = index
+        self.tokens = tokens
+        self.kind = None
+        self.name = None
+        self.sql_name = None
+        self.defines = None
+        self._references = None
+
+        # Comments before the statement itself, e.g. `-- sp:cache` annotations
+        self.comments = []
+        for token in tokens:
+            if token.kind == 'comment':
+                self.comments.append(token.value)
+            elif token.kind != 'space':
+                break
+        self._parse_definition()
+
+    def __repr__(self):
+        return '<Statement {}>'.format(self.describe())
+
+    def describe(self) -> str:
+        if self.name is not None:
+            what = 'CREATE {} {}'.format(self.kind.upper(), self.name)
+        else:
+            what = ' '.join(token.value for token in self.tokens if token.kind not in SKIPPED_KINDS)
+            what = ' '.join(what.split()[:4])
+        return '{}:{} {}'.format(self.file or '<sql>', self.line, what)
+
+    def _parse_definition(self):
+        words = [token for token in self.tokens[:20] if token.kind not in SKIPPED_KINDS]
+        upper = [token.value.upper() if token.kind == 'ident' else None for token in words]
+        if not upper or upper[0] != 'CREATE':
+            return
+        i = 1
+        if upper[i:i + 2] == ['OR', 'REPLACE']:
+            i += 2
+        while i < len(upper) and upper[i] in DEFINITION_MODIFIERS:
+            i += 1
+        for words_, kind in list(DEFINITION_KINDS.items()) + list(OBJECT_KINDS.items()):
+            if tuple(upper[i:i + len(words_)]) == words_:
+                i += len(words_)
+                break
+        else:
+            return
+        if upper[i:i + 3] == ['IF', 'NOT', 'EXISTS']:
+            i += 3
+
+        parts = self._qualified_name(words, i)
+        if not parts:
+            return
+        self.defines = '.'.join(identifier(part) for part in parts)
+        if kind in DEFINITION_KINDS.values():
+            self.kind, self.name = kind, self.defines
+            self.sql_name = '.'.join(
+                part.value if part.kind == 'quoted_ident' else part.value.lower() for part in parts
+            )
+
+    @staticmethod
+    def _qualified_name(words: List[Token], i: int) -> List[Token]:
+        parts = []
+        while i < len(words) and words[i].kind in ('ident', 'quoted_ident'):
+            parts.append(words[i])
+            if i + 1 < len(words) and words[i + 1].value == '.':
+                i += 2
+            else:
+                break
+        return parts
+
+    @property
+    def references(self) -> Set[str]:
+        """Names and schema-qualified names, used in the statement"""
+        if self._references is None:
+            self._references = self._collect_references(self.tokens)
+        return self._references
+
+    @classmethod
+    def _collect_references(cls, tokens: List[Token]) -> Set[str]:
+        references = set()
+        previous = None
+        dot = False
+        for token in tokens:
+            if token.kind in ('ident', 'quoted_ident'):
+                name = identifier(token)
+                references.add(name)
+                if dot and previous is not None:
+                    references.add(previous + '.' + name)
+                previous, dot = name, False
+            elif token.kind == 'dollar':
+                # Bodies of functions reference other objects too
+                references |= cls._collect_references(list(tokenize(dollar_body(token))))
+                previous, dot = None, False
+            elif token.value == '.':
+                dot = True
+            elif token.kind not in SKIPPED_KINDS:
+                previous, dot = None, False
+        return references
+
+
+def split_statements(sql: str, file: Optional[str] = None) -> List[Statement]:
+    """
+    Split sql into statements, statements with only comments are dropped
+
+    Semicolons inside SQL-standard function bodies (`BEGIN ATOMIC ... END`) don't split statements, `CASE ... END`
+    inside the body is tracked, so its END doesn't close the body.
+    """
+    statements = []
+    tokens = []
+    line = 1
+    # Nesting of BEGIN ATOMIC and CASE blocks
+    depth = 0
+    previous = None
+
+    def flush():
+        if any(token.kind not in SKIPPED_KINDS for token in tokens):
+            start, end = tokens[0].start, tokens[-1].start + len(tokens[-1].value)
+            first = next(token for token in tokens if token.kind not in SKIPPED_KINDS)
+            statements.append(Statement(sql[start:end].strip(), tokens, file,
+                                        line + sql.count('\n', start, first.start), len(statements)))
+
+    for token in tokenize(sql):
+        if token.kind == 'ident':
+            word = token.value.upper()
+            if (word == 'ATOMIC' and previous == 'BEGIN') or (depth and word == 'CASE'):
+                depth += 1
+            elif depth and word == 'END':
+                depth -= 1
+            previous = word
+        elif token.kind not in SKIPPED_KINDS:
+            previous = None
+        if token.kind == 'semicolon' and not depth:
+            flush()
+            line += sql.count('\n', tokens[0].start if tokens else token.start, token.start)
+            tokens = []
+            continue
+        tokens.append(token)
+    flush()
+    return statements
+
+
+def parse_definitions(sql: str) -> List[Statement]:
+    """Statements of the sql, that define functions, views and materialized views"""
+    return [statement for statement in split_statements(sql) if statement.name is not None]
+
+
+def dependency_order(statements: List[Statement]) -> List[List[Statement]]:
+    """
+    Order statements so that objects are created before statements, that use them
+
+    Statements of one file keep their order. Returns groups of statements, that don't depend on each other and
+    can be executed in parallel, statements inside the group are in topological order. Dependency cycles are
+    broken in favor of original order of statements.
+    """
+    definers = {}  # type: Dict[str, List[int]]
+    for i, statement in enumerate(statements):
+        if statement.defines is not None:
+            definers.setdefault(statement.defines, []).append(i)
+
+    dependencies = [set() for _ in statements]
+    previous_in_file = {}
+    for i, statement in enumerate(statements):
+        if statement.file in previous_in_file:
+            dependencies[i].add(previous_in_file[statement.file])
+        previous_in_file[statement.file] = i
+        for name in statement.references & definers.keys():
+            if name != statement.defines:
+                dependencies[i].update(definers[name])
+
+    # Independent groups are connected components of the graph
+    parents = list(range(len(statements)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for i, deps in enumerate(dependencies):
+        for dep in deps:
+            parents[find(dep)] = find(i)
+
+    dependents = [[] for _ in statements]
+    pending = [len(deps) for deps in dependencies]
+    for i, deps in enumerate(dependencies):
+        for dep in deps:
+            dependents[dep].append(i)
+
+    order = []
+    ready = [i for i, count in enumerate(pending) if count == 0]
+    heapq.heapify(ready)
+    done = set()
+    while len(order) < len(statements):
+        if not ready:
+            i = min(i for i in range(len(statements)) if i not in done)
+            logger.warning('Dependency cycle on {}, original order is used'.format(statements[i].describe()))
+        else:
+            i = heapq.heappop(ready)
+            if i in done:
+                continue
+        done.add(i)
+        order.append(i)
+        for dependent in dependents[i]:
+            pending[dependent] -= 1
+            if pending[dependent] == 0 and dependent not in done:
+                heapq.heappush(ready, dependent)
+
+    groups = {}
+    for i in order:
+        groups.setdefault(find(i), []).append(statements[i])
+    return list(groups.values())
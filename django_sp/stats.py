@@ -0,0 +1,171 @@
+import io
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import IO, Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from . import logger as base_logger
+
+logger = base_logger.getChild(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def result_rows(res: Any, ret: Any) -> Optional[int]:
+    """Number of rows in the result of `_get_res`, None if it is not known without consuming the result"""
+    if ret == 'one':
+        return 0 if res is None else 1
+    if ret in ('cursor', 'stream', 'json'):
+        return None
+    if isinstance(res, dict):
+        # 'columns' row type and 'numpy' mode: values lists or arrays per column
+        return len(next(iter(res.values()))) if res else 0
+    return len(res)
+
+
+def result_bytes(res: Any, ret: Any) -> Optional[int]:
+    """Size of `ret='json'` result in UTF-8 bytes, None for other modes"""
+    if ret != 'json':
+        return None
+    return len(res.encode('utf-8')) if isinstance(res, str) else len(res)
+
+
+class CountingWriter:
+    """File-like wrapper, that counts size of data written to the wrapped file, text is counted in UTF-8 bytes"""
+
+    def __init__(self, fileobj: IO):
+        self.fileobj = fileobj
+        self.size = 0
+
+    def write(self, data: Union[str, bytes]) -> Any:
+        self.size += len(data.encode('utf-8')) if isinstance(data, str) else len(data)
+        return self.fileobj.write(data)
+
+    @classmethod
+    def wrap(cls, fileobj: IO) -> 'CountingWriter':
+        """Wrapper of the same kind as the file, text or binary"""
+        if isinstance(fileobj, io.TextIOBase):
+            return TextCountingWriter(fileobj)
+        return cls(fileobj)
+
+
+class TextCountingWriter(CountingWriter, io.TextIOBase):
+    """CountingWriter for text files, psycopg2 writes `str` only to `io.TextIOBase` instances"""
+
+    def writable(self) -> bool:
+        return True
+
+
+class ProcedureStats:
+    """Counters and duration histogram of one procedure"""
+    __slots__ = ('kind', 'calls', 'errors', 'cache_hits', 'rows', 'bytes', 'duration_sum', 'buckets')
+
+    def __init__(self, kind: str, buckets_count: int):
+        self.kind = kind
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.rows = 0
+        self.bytes = 0
+        self.duration_sum = 0.0
+        # The last one is +Inf bucket
+        self.buckets = [0] * (buckets_count + 1)
+
+
+class CallStats:
+    """
+    In-process statistics of procedures and views calls: calls, errors, cache hits, rows, bytes and histogram
+    of durations per procedure
+
+    Statistics are per process, for multiprocess servers every worker exposes its own ones.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._stats = {}  # type: Dict[str, ProcedureStats]
+        self._lock = threading.Lock()
+
+    def record(self, name: str, kind: str, duration: float, rows: Optional[int] = None, size: Optional[int] = None,
+               error: bool = False, cached: bool = False):
+        bucket = bisect_left(self.buckets, duration)
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = ProcedureStats(kind, len(self.buckets))
+            stats.calls += 1
+            stats.errors += error
+            stats.cache_hits += cached
+            stats.rows += rows or 0
+            stats.bytes += size or 0
+            stats.duration_sum += duration
+            stats.buckets[bucket] += 1
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Statistics by procedure name, histogram is list of (upper bound, cumulative count) pairs as in Prometheus
+        """
+        with self._lock:
+            items = [(name, stats, list(stats.buckets)) for name, stats in sorted(self._stats.items())]
+
+        result = OrderedDict()
+        for name, stats, buckets in items:
+            cumulative = 0
+            histogram = []
+            for bound, count in zip(self.buckets + (float('inf'),), buckets):
+                cumulative += count
+                histogram.append((bound, cumulative))
+            result[name] = {
+                'kind': stats.kind,
+                'calls': stats.calls,
+                'errors': stats.errors,
+                'cache_hits': stats.cache_hits,
+                'rows': stats.rows,
+                'bytes': stats.bytes,
+                'duration_sum': stats.duration_sum,
+                'duration_mean': stats.duration_sum / stats.calls if stats.calls else 0.0,
+                'duration_histogram': histogram,
+            }
+        return result
+
+    def prometheus(self, prefix: str = 'django_sp') -> str:
+        """Statistics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(metric_name: str, metric_type: str, help_text: str, samples: List[Tuple[str, str, Any]]):
+            lines.append('# HELP {}_{} {}'.format(prefix, metric_name, help_text))
+            lines.append('# TYPE {}_{} {}'.format(prefix, metric_name, metric_type))
+            for suffix, labels, value in samples:
+                lines.append('{}_{}{}{{{}}} {}'.format(prefix, metric_name, suffix, labels, _format_value(value)))
+
+        def labels(name: str, stats: Dict[str, Any], **extra) -> str:
+            pairs = [('name', name), ('kind', stats['kind'])] + sorted(extra.items())
+            return ','.join('{}="{}"'.format(key, _escape(str(value))) for key, value in pairs)
+
+        samples = []
+        for name, stats in snapshot.items():
+            for bound, count in stats['duration_histogram']:
+                samples.append(('_bucket', labels(name, stats, le=_format_value(bound)), count))
+            samples.append(('_sum', labels(name, stats), stats['duration_sum']))
+            samples.append(('_count', labels(name, stats), stats['calls']))
+        metric('call_duration_seconds', 'histogram', 'Duration of procedure and view calls.', samples)
+
+        for key, help_text in (('errors', 'Failed calls.'), ('cache_hits', 'Calls served from the result cache.'),
+                               ('rows', 'Rows fetched.'), ('bytes', 'Bytes of JSON and COPY results.')):
+            metric('call_{}_total'.format(key), 'counter', help_text,
+                   [('', labels(name, stats), stats[key]) for name, stats in snapshot.items()])
+        return '\n'.join(lines) + '\n'
+
+
+def _format_value(value: Any) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
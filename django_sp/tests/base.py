@@ -1,9 +1,9 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 
 
-class BaseTestCase(TestCase):
+class LoaderTestMixin:
     def setUp(self):
-        super(BaseTestCase, self).setUp()
+        super(LoaderTestMixin, self).setUp()
         self.sp_loader.populate_helper()
         self.sp_loader.load_sp_into_db()
 
@@ -12,3 +12,11 @@ class BaseTestCase(TestCase):
         from django_sp import sp_loader
 
         return sp_loader()
+
+
+class BaseTestCase(LoaderTestMixin, TestCase):
+    pass
+
+
+class BaseTransactionTestCase(LoaderTestMixin, TransactionTestCase):
+    """For code, that uses the database from other threads: data of `TestCase` is not committed, they don't see it"""
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+
+from django_sp.aio import AsyncProcedure, AsyncStream
+from django_sp.tests.base import BaseTestCase, BaseTransactionTestCase
+
+
+class AsyncLoaderTestCase(BaseTestCase):
+    def setUp(self):
+        super(AsyncLoaderTestCase, self).setUp()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        super(AsyncLoaderTestCase, self).tearDown()
+
+    def test_procedures(self):
+        self.assertTrue('test_function' in self.sp_loader.aio)
+        self.assertIsInstance(self.sp_loader.aio.test_function, AsyncProcedure)
+        self.assertIsInstance(self.sp_loader.aio.test_view(ret='stream'), AsyncStream)
+        with self.assertRaises(AttributeError):
+            _ = self.sp_loader.aio.unknown_procedure
+
+    def test_run_in_thread_pool(self):
+        thread_name = self.loop.run_until_complete(self.sp_loader.aio.run(lambda: threading.current_thread().name))
+        self.assertNotEqual(thread_name, threading.current_thread().name)
+
+
+class AsyncCallsTestCase(BaseTransactionTestCase):
+    def setUp(self):
+        super(AsyncCallsTestCase, self).setUp()
+        self.loop = asyncio.new_event_loop()
+        cursor = self.sp_loader.connection.cursor()
+        cursor.execute("INSERT INTO test_table (name, amount) VALUES ('test', 100), ('test2', 200)")
+        cursor.close()
+
+    def tearDown(self):
+        self.loop.close()
+        cursor = self.sp_loader.connection.cursor()
+        cursor.execute("DELETE FROM test_table")
+        cursor.close()
+        super(AsyncCallsTestCase, self).tearDown()
+
+    def test_call(self):
+        self.assertEqual(self.loop.run_until_complete(self.sp_loader.aio.test_function(100)), {'test_function': 400})
+        rows = self.loop.run_until_complete(self.sp_loader.aio.test_view('amount > %s', [300], ret='all'))
+        self.assertEqual([row['name'] for row in rows], ['test2'])
+
+    def test_stream(self):
+        async def consume():
+            names = []
+            async for row in self.sp_loader.aio.test_view(ret='stream', itersize=1):
+                names.append(row['name'])
+            return names
+
+        self.assertEqual(sorted(self.loop.run_until_complete(consume())), ['test', 'test2'])
+
+    def test_stream_break(self):
+        async def first():
+            async with self.sp_loader.aio.test_view(ret='stream', itersize=1) as stream:
+                async for row in stream:
+                    return stream, row
+
+        stream, row = self.loop.run_until_complete(first())
+        self.assertIn(row['name'], ('test', 'test2'))
+        self.assertIsNone(stream._executor)
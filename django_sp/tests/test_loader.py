@@ -1,5 +1,28 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from django_sp.cache import ResultCache, make_policy, parse_annotations
+from django_sp.loader import Loader
+from django_sp.manifest import Manifest
+from django_sp.pg_stats import collect, diff, rank
+from django_sp.routers import ReplicaRouter
+from django_sp.signatures import CONVERTERS, Argument, Signature, load_signatures
+from django_sp.signals import post_call
+from django_sp.stats import CallStats, CountingWriter, result_bytes
 from django_sp.tests.base import BaseTestCase
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class LoaderTestCase(BaseTestCase):
     def setUp(self):
@@ -49,3 +72,371 @@ class LoaderTestCase(BaseTestCase):
         self.assertEqual(self.sp_loader.row_to_dict(cursor.fetchone(), columns),
                          {'id': 2, 'name': 'test2', 'amount': 400})
         self.assertEqual(self.sp_loader.row_to_dict(cursor.fetchone(), columns), None)
+
+    def test_view_stream(self):
+        rows = self.sp_loader.test_view(ret='stream', itersize=1)
+        self.assertEqual(
+            list(rows),
+            [
+                {'id': 1, 'name': 'test', 'amount': 200},
+                {'id': 2, 'name': 'test2', 'amount': 400}
+            ]
+        )
+
+        rows = self.sp_loader.test_view(filters='amount > %s', params=(1000,), ret='stream')
+        self.assertEqual(list(rows), [])
+
+    def test_prepared(self):
+        self.assertEqual(self.sp_loader.test_function(100, prepare=True), {'test_function': 400})
+        self.assertEqual(self.sp_loader.test_function(num=10, prepare=True), {'test_function': 40})
+        self.assertEqual(self.sp_loader.test_function(100, prepare=True), {'test_function': 400})
+        self.assertEqual(
+            self.sp_loader.test_view(filters='amount > %s', params=(300,), ret='all', prepare=True),
+            [{'id': 2, 'name': 'test2', 'amount': 400}]
+        )
+
+        # Reloading deallocates prepared statements
+        self.sp_loader.load_sp_into_db()
+        self.assertEqual(self.sp_loader.test_function(100, prepare=True), {'test_function': 400})
+
+    def test_callables_cached(self):
+        procedure = self.sp_loader.test_function
+        self.assertIs(procedure, self.sp_loader['test_function'])
+        self.assertEqual(procedure.statement(1, ())[0], 'SELECT * FROM test_function(%s::integer)')
+        self.assertEqual(procedure.statement(0, ('num',))[0], 'SELECT * FROM test_function(num := %s::integer)')
+        self.assertEqual(self.sp_loader.test_function(num='25'), {'test_function': 100})
+
+    def test_arguments_validation(self):
+        with self.assertRaises(TypeError):
+            self.sp_loader.test_function(1, 2)
+        with self.assertRaises(TypeError):
+            self.sp_loader.test_function(number=1)
+        with self.assertRaises(ValueError):
+            self.sp_loader.test_function('abc')
+
+        signature, = self.sp_loader.signatures('test_function')
+        self.assertEqual(signature.volatility, 'volatile')
+        self.assertEqual([(argument.name, argument.type) for argument in signature.arguments], [('num', 'integer')])
+
+    def test_routing(self):
+        router = ReplicaRouter(replicas=['replica'])
+        # Inside transaction everything stays on the primary
+        self.assertIsNone(router.db_for_call(self.sp_loader.test_view))
+        self.assertEqual(self.sp_loader.test_function.volatility, 'volatile')
+        self.assertEqual(self.sp_loader.test_view.volatility, 'stable')
+        self.assertEqual(self.sp_loader.test_function(100, using='default'), {'test_function': 400})
+
+    def test_result_cache(self):
+        self.assertEqual(
+            parse_annotations("-- sp:cache timeout=10 tags=a,b\nCREATE OR REPLACE VIEW some_view AS SELECT 1;"),
+            {'some_view': make_policy({'timeout': 10, 'tags': ['a', 'b']})}
+        )
+
+        self.sp_loader.cache.policies['test_view'] = make_policy({'timeout': 60, 'tags': 'test'})
+        self.sp_loader.cache.invalidate('test_view')
+        self.assertEqual(len(self.sp_loader.test_view(ret='all')), 2)
+
+        cursor = self.sp_loader.connection.cursor()
+        cursor.execute("INSERT INTO test_table (name, amount) VALUES ('test3', 300)")
+        cursor.close()
+        self.assertEqual(len(self.sp_loader.test_view(ret='all')), 2)
+
+        self.sp_loader.cache.invalidate_tag('test')
+        self.assertEqual(len(self.sp_loader.test_view(ret='all')), 3)
+        del self.sp_loader.cache.policies['test_view']
+
+    def test_many(self):
+        self.assertEqual(
+            self.sp_loader.test_function.many([(1,), (2,), (3,)], batch_size=2),
+            [{'test_function': 4}, {'test_function': 8}, {'test_function': 12}]
+        )
+        self.assertEqual(self.sp_loader.test_function.many([{'num': 1}], ret='all'), [[{'test_function': 4}]])
+        with self.assertRaises(ValueError):
+            self.sp_loader.test_function.many([(1,), {'num': 1}])
+
+    def test_many_without_validation(self):
+        validate_arguments = self.sp_loader.validate_arguments
+        self.sp_loader.validate_arguments = False
+        self.sp_loader.reset_signatures()
+        try:
+            self.assertEqual(self.sp_loader.test_function.many([(1,), (2,)]),
+                             [{'test_function': 4}, {'test_function': 8}])
+        finally:
+            self.sp_loader.validate_arguments = validate_arguments
+            self.sp_loader.reset_signatures()
+
+    def test_row_types(self):
+        self.assertEqual(self.sp_loader.test_view(ret='all', row_type='tuple'),
+                         [(1, 'test', 200), (2, 'test2', 400)])
+        self.assertEqual(self.sp_loader.test_view(ret='all', row_type='columns'),
+                         {'id': [1, 2], 'name': ['test', 'test2'], 'amount': [200, 400]})
+        rows = self.sp_loader.test_view(ret='all', row_type='record')
+        self.assertEqual([(row.id, row.amount) for row in rows], [(1, 200), (2, 400)])
+        self.assertIs(type(rows[0]), type(self.sp_loader.test_view(row_type='record')))
+        self.assertEqual(list(self.sp_loader.test_view(ret='stream', row_type='tuple')),
+                         [(1, 'test', 200), (2, 'test2', 400)])
+        with self.assertRaises(ValueError):
+            self.sp_loader.test_view(row_type='columns')
+
+    @skipUnless(numpy, 'numpy is not installed')
+    def test_numpy(self):
+        cursor = self.sp_loader.connection.cursor()
+        cursor.execute("INSERT INTO test_table (name, amount) VALUES ('test3', NULL)")
+        cursor.close()
+
+        arrays = self.sp_loader.test_view(ret='numpy')
+        self.assertEqual(list(arrays), ['id', 'name', 'amount'])
+        self.assertEqual(arrays['id'].dtype, numpy.int32)
+        self.assertEqual(arrays['id'].tolist(), [1, 2, 3])
+        self.assertEqual(arrays['name'].tolist(), ['test', 'test2', 'test3'])
+        self.assertEqual(arrays['amount'].tolist(), [200, 400, None])
+        self.assertEqual(arrays['amount'].mask.tolist(), [False, False, True])
+
+    def test_copy(self):
+        out = StringIO()
+        self.assertEqual(self.sp_loader.test_view.copy_to(out, 'amount > %s', [300], header=True), 1)
+        self.assertEqual(out.getvalue(), 'id,name,amount\n2,test2,400\n')
+
+        out = BytesIO()
+        self.sp_loader.test_function.copy_to(out, 100, format='text')
+        self.assertEqual(out.getvalue(), b'400\n')
+
+        loaded = self.sp_loader.copy_from('test_table', StringIO('test3,300\ntest4,400\n'),
+                                          columns=['name', 'amount'])
+        self.assertEqual(loaded, 2)
+        self.assertEqual(len(self.sp_loader.test_view(ret='all')), 4)
+
+        with self.assertRaises(ValueError):
+            self.sp_loader.test_view.copy_to(out, format='binary', header=True)
+
+    def test_json(self):
+        self.assertEqual(
+            json.loads(self.sp_loader.test_view('amount > %s', [300], ret='json')),
+            [{'id': 2, 'name': 'test2', 'amount': 400}]
+        )
+        self.assertEqual(self.sp_loader.test_view('amount > %s', [1000], ret='json'), '[]')
+        self.assertEqual(json.loads(self.sp_loader.test_function(100, ret='json', prepare=True)),
+                         [{'test_function': 400}])
+
+    def test_pipeline(self):
+        with self.sp_loader.pipeline() as pipe:
+            function = pipe.test_function(100)
+            view = pipe.test_view(filters='amount > %s', params=(300,), ret='all')
+            first = pipe['test_view'](ret=1)
+            self.assertFalse(function.done())
+            with self.assertRaises(RuntimeError):
+                function.result()
+        self.assertEqual(function.result(), {'test_function': 400})
+        self.assertEqual(view.result(), [{'id': 2, 'name': 'test2', 'amount': 400}])
+        self.assertEqual(first.result(), [{'id': 1, 'name': 'test', 'amount': 200}])
+
+        with self.assertRaises(ValueError):
+            self.sp_loader.pipeline().test_view(ret='cursor')
+        with self.assertRaises(TypeError):
+            self.sp_loader.pipeline().test_function(100, prepare=True)
+
+        with self.sp_loader.pipeline(combine=True) as pipe:
+            function = pipe.test_function(100, using='default')
+            view = pipe.test_view(filters="name LIKE 'test%'", ret='all', row_type='tuple')
+        self.assertEqual(function.result(), {'test_function': 400})
+        self.assertEqual(view.result(), [(1, 'test', 200), (2, 'test2', 400)])
+
+    def test_stats(self):
+        calls = []
+
+        def receiver(sender, **kwargs):
+            calls.append(kwargs)
+
+        self.sp_loader.metrics.reset()
+        post_call.connect(receiver)
+        try:
+            self.sp_loader.test_function(100)
+            self.sp_loader.test_view('amount > %s', [100], ret='all')
+        finally:
+            post_call.disconnect(receiver)
+
+        self.assertEqual([(call['name'], call['kind'], call['rows']) for call in calls],
+                         [('test_function', 'function', 1), ('test_view', 'view', 2)])
+        stats = self.sp_loader.stats()
+        self.assertEqual(stats['test_view']['calls'], 1)
+        self.assertEqual(stats['test_view']['rows'], 2)
+        self.assertEqual(stats['test_view']['duration_histogram'][-1], (float('inf'), 1))
+        self.assertIn('django_sp_call_duration_seconds_count{name="test_function",kind="function"} 1',
+                      self.sp_loader.metrics.prometheus())
+
+        out = StringIO()
+        self.assertEqual(self.sp_loader.test_view.copy_to(out, 'amount > %s', [100]), 2)
+        self.assertEqual(self.sp_loader.stats()['test_view']['bytes'], len(out.getvalue()))
+
+    def test_profile(self):
+        self.sp_loader.plans.clear()
+        self.assertEqual(self.sp_loader.test_view('amount > %s', [100], ret='all', profile=True),
+                         [{'id': 1, 'name': 'test', 'amount': 200}, {'id': 2, 'name': 'test2', 'amount': 400}])
+        entry = self.sp_loader.plans.get('test_view')
+        self.assertEqual(entry['statement'], 'SELECT * FROM test_view WHERE amount > %s')
+        self.assertIn('Node Type', entry['plan']['Plan'])
+        self.assertIsNotNone(entry['execution_time'])
+        self.assertIsNone(self.sp_loader.plans.get('test_function'))
+
+        out = StringIO()
+        call_command('sp_profile', 'test_function', '100', runs=3, stdout=out)
+        self.assertIn('3 runs: min', out.getvalue())
+        self.assertIn('Execution Time', out.getvalue())
+
+    def test_server_stats(self):
+        stats = self.sp_loader.server_stats()
+        self.assertTrue(set(stats) <= set(self.sp_loader.list()))
+        out = StringIO()
+        call_command('sp_stats', json=True, stdout=out)
+        self.assertEqual({entry['name'] for entry in json.loads(out.getvalue())}, set(stats))
+
+        current = collect({'test_function': 'function', 'test_view': 'view'},
+                          {'test_function': (5, 10.0, 8.0)}, {'test_view': (4, 4.0, 40)})
+        self.assertEqual(current['test_function']['mean_time'], 2.0)
+        self.assertIsNone(current['test_function']['rows'])
+        self.assertEqual([name for name, entry in rank(current, 'rows')], ['test_view', 'test_function'])
+        snapshot = {'test_function': dict(current['test_function']),
+                    'test_view': {'calls': 2, 'total_time': 1.0, 'rows': 10}}
+        since = diff(current, snapshot)
+        self.assertEqual(list(since), ['test_view'])
+        self.assertEqual((since['test_view']['calls'], since['test_view']['mean_time']), (2, 1.5))
+
+    def test_incremental_upload(self):
+        report = self.sp_loader.load_sp_into_db(force=False)
+        self.assertEqual(report.changed, [])
+        self.assertEqual(len(report.skipped), len(self.sp_loader._sp_list))
+
+        cursor = self.sp_loader.connection.cursor()
+        cursor.execute("UPDATE django_sp_checksums SET checksum = ''")
+        cursor.close()
+        report = self.sp_loader.load_sp_into_db(force=False, dry_run=True)
+        self.assertEqual(report.changed, self.sp_loader._sp_list)
+        report = self.sp_loader.load_sp_into_db(force=False)
+        self.assertEqual(report.changed, self.sp_loader._sp_list)
+        self.assertEqual(self.sp_loader.test_function(100), {'test_function': 400})
+
+        out = StringIO()
+        call_command('upload_sp', dry_run=True, stdout=out)
+        self.assertIn('default: 0 changed, {} skipped, 0 failed'.format(len(self.sp_loader._sp_list)),
+                      out.getvalue())
+
+
+class ManifestTestCase(SimpleTestCase):
+    def test_manifest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'manifest.json')
+            sql_path = os.path.join(directory, 'test.sql')
+            with open(sql_path, 'w') as f:
+                f.write('-- sp:cache timeout=30 tags=a\nCREATE OR REPLACE FUNCTION some_function() ...')
+
+            with override_settings(SP_MANIFEST=path):
+                loader = Loader(extra_files=[sql_path])
+            self.assertIn('some_function', loader)
+            self.assertEqual(loader.cache.policy('some_function'), make_policy({'timeout': 30, 'tags': 'a'}))
+
+            manifest = Manifest(path)
+            stat = manifest.stat(sql_path)
+            self.assertEqual(manifest.get(sql_path, stat),
+                             ([('function', 'some_function', 'some_function')], loader.cache.policies))
+            self.assertIsNone(manifest.get(sql_path, (0, stat[1])))
+
+            # Unchanged file is not parsed again
+            manifest.set(sql_path, stat, [('view', 'other_view', 'other_view')], {})
+            manifest.save()
+            with override_settings(SP_MANIFEST=path):
+                loader = Loader(extra_files=[sql_path])
+            self.assertIn('other_view', loader)
+
+
+class LoaderAttributesTestCase(SimpleTestCase):
+    def test_clashing_names(self):
+        with tempfile.TemporaryDirectory() as directory:
+            sql_path = os.path.join(directory, 'test.sql')
+            with open(sql_path, 'w') as f:
+                f.write('CREATE VIEW metrics AS SELECT 1;\nCREATE VIEW cache AS SELECT 1;\n'
+                        'CREATE FUNCTION Some_Function() ...;\nCREATE VIEW "Quoted View" AS SELECT 1;')
+            loader = Loader(extra_files=[sql_path])
+
+            self.assertIs(loader.Some_Function, loader['some_function'])
+            self.assertIn('SOME_FUNCTION', loader)
+            self.assertIsInstance(loader.metrics, CallStats)
+            self.assertIsInstance(loader.cache, ResultCache)
+            self.assertEqual(loader['metrics'].kind, 'view')
+            self.assertEqual(loader['Quoted View'].statement('*', None, False, False),
+                             'SELECT * FROM "Quoted View"')
+            self.assertIs(loader.some_function, loader['some_function'])
+
+            with open(sql_path, 'w') as f:
+                f.write('CREATE VIEW metrics AS SELECT 1;\n')
+            loader.populate_helper()
+            self.assertIsInstance(loader.metrics, CallStats)
+            self.assertIsInstance(loader.cache, ResultCache)
+            self.assertNotIn('some_function', vars(loader))
+
+
+class ConvertersTestCase(SimpleTestCase):
+    def test_converters(self):
+        self.assertEqual(CONVERTERS['integer'](2.0), 2)
+        self.assertEqual(CONVERTERS['bigint'](Decimal('3')), 3)
+        for value in (2.5, Decimal('1.5'), float('nan'), True):
+            with self.assertRaises(ValueError):
+                CONVERTERS['integer'](value)
+        self.assertEqual(CONVERTERS['numeric'](0.1), Decimal('0.1'))
+        self.assertEqual(CONVERTERS['numeric']('1.25'), Decimal('1.25'))
+        self.assertIs(CONVERTERS['boolean'](' True'), True)
+        self.assertIs(CONVERTERS['boolean']('f'), False)
+        with self.assertRaises(ValueError):
+            CONVERTERS['boolean']('maybe')
+
+
+class ReplicaRouterTestCase(SimpleTestCase):
+    def test_volatility(self):
+        loader = Loader()
+        loader.validate_arguments = False
+        loader._signatures = {
+            'test_function': [Signature('test_function', [Argument('num', 'integer', False)], 'stable', False)],
+        }
+        procedure = loader.test_function
+        self.assertEqual(procedure.volatility, 'stable')
+        self.assertEqual(procedure.statement(1, ())[0], 'SELECT * FROM test_function(%s)')
+
+        router = ReplicaRouter(replicas=['replica'])
+        self.assertEqual(router.db_for_call(procedure), 'replica')
+        loader._signatures['test_function'][0].volatility = 'volatile'
+        self.assertIsNone(router.db_for_call(procedure))
+
+
+class SignaturesTestCase(SimpleTestCase):
+    def test_qualified_names(self):
+        class Cursor:
+            def execute(self, sql, params):
+                self.params = params
+
+            def fetchall(self):
+                return [
+                    ('billing', False, 'get_invoice', 's', False, 0, ['id'], None, ['integer']),
+                    ('public', True, 'get_invoice', 'v', False, 0, ['id'], None, ['text']),
+                    ('other', False, 'get_invoice', 'v', False, 0, ['id'], None, ['bigint']),
+                ]
+
+        cursor = Cursor()
+        signatures = load_signatures(cursor, {'billing.get_invoice': ['billing', 'get_invoice'],
+                                              'get_invoice': ['get_invoice']})
+        self.assertEqual(cursor.params, (['get_invoice'],))
+        self.assertEqual([(s.name, s.volatility, s.arguments[0].type) for s in signatures['billing.get_invoice']],
+                         [('billing.get_invoice', 'stable', 'integer')])
+        self.assertEqual([s.arguments[0].type for s in signatures['get_invoice']], ['text'])
+
+
+class StatsTestCase(SimpleTestCase):
+    def test_result_bytes(self):
+        self.assertEqual(result_bytes('[{"name": "ё"}]', 'json'), 16)
+        self.assertIsNone(result_bytes([{'name': 'ё'}], 'all'))
+
+    def test_counting_writer(self):
+        writer = CountingWriter.wrap(StringIO())
+        writer.write('ё,1\n')
+        self.assertEqual((writer.size, writer.fileobj.getvalue()), (5, 'ё,1\n'))
+        writer = CountingWriter.wrap(BytesIO())
+        writer.write(b'a,1\n')
+        self.assertEqual(writer.size, 4)
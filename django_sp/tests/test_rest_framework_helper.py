@@ -1,9 +1,12 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
+from urllib.parse import parse_qs, urlencode, urlparse
 
 from django.core.exceptions import ValidationError
 
-from django_sp.helpers.rest_framework import CombinedSearchFilter, DecimalFilter, IntegerFilter, RawSQLFilterSet, \
-    StringFilter
+from django_sp.helpers.rest_framework import CombinedSearchFilter, DecimalFilter, IntegerFilter, KeysetPaginator, \
+    RawSQLFilterSet, SQLPageNumberPaginator, StreamingJSONExport, StringFilter
 from django_sp.tests.base import BaseTestCase
 
 
@@ -27,12 +30,27 @@ class GenericORFilterSet(RawSQLFilterSet):
         logical_or = ('age', 'amount')
 
 
+class ViewFilterSet(RawSQLFilterSet):
+    name = StringFilter()
+    amount = IntegerFilter()
+
+    class Meta:
+        order_by = ('-amount', 'id')
+
+
 class Request:
     query_params = None
 
     def __init__(self, query_params):
         self.query_params = query_params
 
+    def build_absolute_uri(self):
+        return 'http://testserver/?' + urlencode(self.query_params)
+
+
+def request_from_link(link):
+    return Request({key: value[0] for key, value in parse_qs(urlparse(link).query).items()})
+
 
 class DRFHelperTestCase(BaseTestCase):
     def test_exceptions(self):
@@ -98,3 +116,116 @@ class DRFHelperTestCase(BaseTestCase):
         self.assertEqual(filterset.sql.strip(),
                          'name = %s AND (uno LIKE %s OR dos LIKE %s OR tres LIKE %s) ORDER BY amount DESC')
         self.assertEqual(filterset.params, ('test', '%chroot%', '%chroot%', '%chroot%'))
+
+    def test_multiple_order_by(self):
+        filterset = ViewFilterSet(Request({'name': 'test'}))
+        self.assertEqual(filterset.sql.strip(), 'name = %s ORDER BY amount DESC, id ASC')
+        self.assertEqual(filterset.conditions, 'name = %s')
+        self.assertEqual(filterset.ordering, (('amount', True), ('id', False)))
+
+    def test_concurrent_filtersets(self):
+        first = GenericFilterSet(Request({'some_name': 'first', 'age': 20}))
+        second = GenericFilterSet(Request({'some_name': 'second', 'age': 30}))
+        self.assertEqual(first.sql, second.sql)
+        self.assertEqual(first.params, ('first', 20))
+        self.assertEqual(second.params, ('second', 30))
+
+        def build(i):
+            filterset = GenericFilterSet(Request({'some_name': str(i), 'age': 10 + i % 90, 'search': str(i)}))
+            return filterset.sql, filterset.params
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for i, (sql, params) in enumerate(executor.map(build, range(500))):
+                self.assertEqual(params, (str(i), 10 + i % 90) + ('%{}%'.format(i),) * 3)
+
+    def test_compiled_conditions(self):
+        ViewFilterSet._compiled.clear()
+        for name, amount in (('first', 10), ('second', 20)):
+            filterset = ViewFilterSet(Request({'name': name, 'amount__gte': amount}))
+            self.assertEqual(filterset.sql.strip(), 'name = %s AND amount >= %s ORDER BY amount DESC, id ASC')
+            self.assertEqual(filterset.params, (name, amount))
+        self.assertEqual(len(ViewFilterSet._compiled), 1)
+
+        # SQL of isnull depends on the value
+        filterset = ViewFilterSet(Request({'amount__isnull': 'true'}))
+        self.assertEqual(filterset.conditions, 'amount IS NULL')
+        filterset = ViewFilterSet(Request({'amount__isnull': 'false'}))
+        self.assertEqual(filterset.conditions, 'amount IS NOT NULL')
+        self.assertEqual(len(ViewFilterSet._compiled), 3)
+
+        class LowerFilter(StringFilter):
+            def filter(self, name, condition, value):
+                self._filter_set.params = value.lower()
+                return 'lower({}) = %s'.format(name)
+
+        class LowerFilterSet(RawSQLFilterSet):
+            name = LowerFilter()
+            amount = IntegerFilter()
+
+        filterset = LowerFilterSet(Request({'name': 'Test', 'amount': 10}))
+        self.assertEqual(filterset.conditions, 'lower(name) = %s AND amount = %s')
+        self.assertEqual(filterset.params, ('test', 10))
+        self.assertEqual(len(LowerFilterSet._compiled), 0)
+
+    def test_keyset_paginator(self):
+        cursor = self.sp_loader.connection.cursor()
+        for i in range(5):
+            cursor.execute("INSERT INTO test_table (name, amount) VALUES ('test', %s)", (i // 2,))
+        cursor.close()
+
+        request = Request({'page_size': 2})
+        paginator = KeysetPaginator('test_view', ViewFilterSet(request), request)
+        self.assertEqual([row['amount'] for row in paginator.data], [4, 2])
+        self.assertIsNone(paginator.get_previous_link())
+
+        request = request_from_link(paginator.get_next_link())
+        paginator = KeysetPaginator('test_view', ViewFilterSet(request), request)
+        self.assertEqual([row['amount'] for row in paginator.data], [2, 0])
+
+        request = request_from_link(paginator.get_next_link())
+        paginator = KeysetPaginator('test_view', ViewFilterSet(request), request)
+        self.assertEqual([row['amount'] for row in paginator.data], [0])
+        self.assertIsNone(paginator.get_next_link())
+
+        request = request_from_link(paginator.get_previous_link())
+        paginator = KeysetPaginator('test_view', ViewFilterSet(request), request)
+        self.assertEqual([row['amount'] for row in paginator.data], [2, 0])
+
+    def test_sql_page_number_paginator(self):
+        cursor = self.sp_loader.connection.cursor()
+        for i in range(5):
+            cursor.execute("INSERT INTO test_table (name, amount) VALUES ('test', %s)", (i,))
+        cursor.close()
+
+        request = Request({'page': 2, 'page_size': 2, 'name': 'test'})
+        paginator = SQLPageNumberPaginator('test_view', ViewFilterSet(request), request)
+        self.assertEqual(paginator.count, 5)
+        self.assertEqual([row['amount'] for row in paginator.data], [4, 2])
+        self.assertTrue(paginator.has_next())
+
+        # Count is cached for the same filters
+        cursor = self.sp_loader.connection.cursor()
+        cursor.execute("INSERT INTO test_table (name, amount) VALUES ('test', 10)")
+        cursor.close()
+        paginator = SQLPageNumberPaginator('test_view', ViewFilterSet(request), request)
+        self.assertEqual(paginator.count, 5)
+
+    def test_streaming_json_export(self):
+        cursor = self.sp_loader.connection.cursor()
+        for i in range(5):
+            cursor.execute("INSERT INTO test_table (name, amount) VALUES ('test', %s)", (i,))
+        cursor.close()
+
+        request = Request({'name': 'test'})
+        export = StreamingJSONExport('test_view', ViewFilterSet(request), request, fields='name, amount')
+        export.chunk_size = 2
+        chunks = list(export.chunks())
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(json.loads(''.join(chunks)),
+                         [{'name': 'test', 'amount': amount} for amount in (8, 6, 4, 2, 0)])
+
+        response = export.response()
+        self.assertEqual(response['Content-Type'], 'application/json')
+        request = Request({'name': 'nothing'})
+        response = StreamingJSONExport('test_view', ViewFilterSet(request), request).response()
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
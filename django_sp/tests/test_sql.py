@@ -0,0 +1,54 @@
+from django.test import SimpleTestCase
+
+from django_sp.sql import dependency_order, split_statements
+
+
+class SQLTestCase(SimpleTestCase):
+    def test_split_statements(self):
+        statements = split_statements(
+            "-- comment; with semicolon\n"
+            "/* nested /* comment; */ */\n"
+            "create   function Reports.\"Total\"(x int) RETURNS text AS $body$ SELECT 'a;b' || $$;$$ $body$;\n"
+            "CREATE MATERIALIZED VIEW IF NOT EXISTS some_view AS SELECT E'it\\'s;' FROM t;;\n"
+            "GRANT SELECT ON some_view TO someone\n",
+            'file.sql'
+        )
+        self.assertEqual(
+            [(s.kind, s.name, s.line) for s in statements],
+            [('function', 'reports.Total', 3), ('materialized view', 'some_view', 4), (None, None, 5)]
+        )
+        self.assertEqual(statements[0].sql_name, 'reports."Total"')
+        self.assertEqual(statements[0].comments, ['-- comment; with semicolon', '/* nested /* comment; */ */'])
+        self.assertIn('some_view', statements[2].references)
+
+    def test_begin_atomic(self):
+        statements = split_statements(
+            "CREATE FUNCTION f(x int) RETURNS int LANGUAGE sql BEGIN ATOMIC\n"
+            "  SELECT CASE WHEN x > 0 THEN 1 ELSE 0 END;\n"
+            "  SELECT 2;\n"
+            "END;\n"
+            "CREATE VIEW v AS SELECT f(1);\n"
+        )
+        self.assertEqual([(s.kind, s.name, s.line) for s in statements], [('function', 'f', 1), ('view', 'v', 5)])
+        self.assertTrue(statements[0].sql.endswith('SELECT 2;\nEND'))
+
+    def test_dependency_order(self):
+        first = split_statements("CREATE VIEW a_view AS SELECT b_function(); CREATE VIEW c_view AS SELECT 1", 'a')
+        second = split_statements("CREATE FUNCTION b_function() RETURNS int AS $$ SELECT 1 $$ LANGUAGE sql", 'b')
+        third = split_statements("CREATE VIEW d_view AS SELECT 1", 'c')
+
+        groups = dependency_order(first + second + third)
+        self.assertEqual(
+            [[s.name for s in group] for group in groups],
+            [['b_function', 'a_view', 'c_view'], ['d_view']]
+        )
+
+    def test_dependency_order_objects(self):
+        first = split_statements("CREATE VIEW a_view AS SELECT * FROM s.b_table", 'a')
+        second = split_statements("CREATE SCHEMA IF NOT EXISTS s; CREATE UNLOGGED TABLE s.b_table (id int)", 'b')
+
+        statements = first + second
+        self.assertEqual([(s.kind, s.name, s.defines) for s in statements],
+                         [('view', 'a_view', 'a_view'), (None, None, 's'), (None, None, 's.b_table')])
+        groups = dependency_order(statements)
+        self.assertEqual([[s.defines for s in group] for group in groups], [['s', 's.b_table', 'a_view']])
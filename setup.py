@@ -10,21 +10,19 @@ setup(
     author='Sergey Kostyuchenko',
     author_email='derfenix@gmail.com',
     description='',
-    install_requires=['django>=1.8'],
+    python_requires='>=3.5',
+    install_requires=['django>=1.11'],
     extras_require={
-        'django-rest-framework_integration': ["djangorestframework"]
+        'django-rest-framework_integration': ["djangorestframework"],
+        'numpy': ["numpy"],
     },
     classifiers=[
         'License :: OSI Approved :: GNU General Public License v3 or later (GPLv3+)',
         'Development Status :: 4 - Beta',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
         'Programming Language :: Python :: 3.5',
         'Programming Language :: Python :: 3.6',
         'Framework :: Django',
-        'Framework :: Django :: 1.8',
-        'Framework :: Django :: 1.9',
-        'Framework :: Django :: 1.10',
+        'Framework :: Django :: 1.11',
     ]
 )